@@ -5,19 +5,27 @@ SMART AGENT DETECTION: Matches from_number OR to_number against agent database
 """
 
 import os
+import re
 import json
+import random
 import logging
 import asyncio
 import threading
 import time
+import uuid
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional, Dict, Any
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 import sqlite3
 from contextlib import contextmanager
+from functools import lru_cache
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 import uvicorn
@@ -54,33 +62,126 @@ DATABASE_PATH = os.environ.get('DATABASE_PATH', 'processed_calls.db')
 # Support agent phone number for direction detection
 SUPPORT_NUMBER = os.environ.get('SUPPORT_NUMBER', '09631084471')
 
+# Virtual number for Customer Support (used for call type detection)
+VIRTUAL_NUMBER = "08047190155"
+
 # Rate limiting configuration
 PROCESSING_DELAY = int(os.environ.get('PROCESSING_DELAY', '5'))
 MAX_CONCURRENT_CALLS = int(os.environ.get('MAX_CONCURRENT_CALLS', '3'))
 
+# Transcripts shorter than this (characters) are posted as-is instead of generating a MOM
+MIN_MOM_TRANSCRIPT_CHARS = int(os.environ.get('MIN_MOM_TRANSCRIPT_CHARS', '40'))
+
 # Department filtering configuration
 ALLOWED_DEPARTMENTS = os.environ.get('ALLOWED_DEPARTMENTS', 'CUSTOMER SUPPORT')
 ALLOWED_DEPT_LIST = [d.strip() for d in ALLOWED_DEPARTMENTS.split(',')] if ALLOWED_DEPARTMENTS.upper() != 'ALL' else []
 
-# Processing semaphore (use threading.Semaphore for cross-thread compatibility)
-processing_semaphore = threading.Semaphore(MAX_CONCURRENT_CALLS)
+# Recording download chunk size (bytes) - keeps memory flat for long recordings
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Number of posted call IDs kept in the in-memory duplicate cache
+PROCESSED_CACHE_SIZE = int(os.environ.get('PROCESSED_CACHE_SIZE', '10000'))
+
+# Minimum spacing between posts to the same Slack webhook (Slack allows ~1 message/sec); 0 disables
+SLACK_MIN_INTERVAL_MS = int(os.environ.get('SLACK_MIN_INTERVAL_MS', '0'))
+
+# Dedicated worker pool for call processing - its size is the concurrency limit, and
+# queued calls wait in the pool's queue instead of parking FastAPI's threadpool threads
+call_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CALLS, thread_name_prefix="call-worker")
+
+def make_session() -> requests.Session:
+    """Keep-alive session whose per-host pool fits every concurrent call worker
+    (the default pool of 10 would drop connections when MAX_CONCURRENT_CALLS is higher)
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=max(10, MAX_CONCURRENT_CALLS))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def encode_json(payload: Dict[str, Any]) -> bytes:
+    """Serialize an outbound JSON body compactly as UTF-8
+    Emoji and non-ASCII text stay as raw UTF-8 instead of 12-byte \\u escapes
+    """
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+# Separator characters stripped from phone numbers in a single translate() pass
+_PHONE_STRIP = str.maketrans('', '', '+- ()')
+_NON_DIGITS = re.compile(r'[^0-9]')
+
+@lru_cache(maxsize=1024)
+def normalize_phone(phone: str) -> str:
+    """Normalize phone number for comparison (memoized - the same numbers recur across webhooks)"""
+    normalized = phone.translate(_PHONE_STRIP)
+    # Remove country code +91
+    if normalized.startswith('91') and len(normalized) == 12:
+        normalized = normalized[2:]
+    # Remove leading 0
+    if normalized.startswith('0') and len(normalized) == 11:
+        normalized = normalized[1:]
+    return normalized
+
+
+# Normalized once at import instead of on every webhook
+NORMALIZED_VIRTUAL_NUMBER = normalize_phone(VIRTUAL_NUMBER)
+
+# Exotel's StartTime layout and the UTC -> IST shift used when formatting call times
+EXOTEL_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+IST_OFFSET = timedelta(hours=5, minutes=30)
+
+
+def parse_call_timestamp(value: str) -> datetime:
+    """Parse a webhook StartTime into a naive datetime
+    ISO strings have any Z/offset dropped; Exotel's "YYYY-MM-DD HH:MM:SS" is parsed as-is.
+    Python 3.11's C fromisoformat reads both shapes (and a trailing Z) in one call,
+    ~40x cheaper than strptime's format interpretation
+    """
+    return datetime.fromisoformat(value).replace(tzinfo=None)
+
 
 # Agent mapping - load from file
+AGENT_MAPPING_FILE = Path('agent_mapping.json')
 AGENT_MAPPING = {}
-def load_agent_mapping():
-    """Load agent mapping from JSON file"""
-    global AGENT_MAPPING
+# (mapping, normalized phone -> mapping key) swapped as one object so readers never see a torn pair
+_agent_mapping_state = (AGENT_MAPPING, {})
+
+@lru_cache(maxsize=8)
+def _parse_agent_mapping(path: str, mtime_ns: int):
+    """Parse agent_mapping.json and build its phone index (cached per file version)"""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    mapping = {k: v for k, v in data.items() if not k.startswith('_')}
+    phone_index = {}
+    for mapped_phone in mapping:
+        # First entry wins if two mapped numbers normalize to the same phone
+        phone_index.setdefault(normalize_phone(mapped_phone), mapped_phone)
+    logger.info(f"✅ Loaded {len(mapping)} agent mappings from database")
+    return mapping, phone_index
+
+def get_agent_mapping():
+    """Return (mapping, phone_index), re-reading the file only when its mtime changes
+    Callers get a consistent pair even if the file is swapped mid-request
+    """
+    global AGENT_MAPPING, _agent_mapping_state
     try:
-        agent_file = Path('agent_mapping.json')
-        if agent_file.exists():
-            with open(agent_file, 'r') as f:
-                data = json.load(f)
-                AGENT_MAPPING = {k: v for k, v in data.items() if not k.startswith('_')}
-            logger.info(f"✅ Loaded {len(AGENT_MAPPING)} agent mappings from database")
-        else:
-            logger.warning("agent_mapping.json not found - using default mappings")
+        mtime_ns = AGENT_MAPPING_FILE.stat().st_mtime_ns
+        state = _parse_agent_mapping(str(AGENT_MAPPING_FILE), mtime_ns)
+    except FileNotFoundError:
+        return _agent_mapping_state
     except Exception as e:
+        # Keep serving the last good mapping if the file is mid-write or invalid
         logger.error(f"Failed to load agent mapping: {e}")
+        return _agent_mapping_state
+    # Single reference assignment - atomic under the GIL, no reader lock needed
+    _agent_mapping_state = state
+    AGENT_MAPPING = state[0]
+    return state
+
+def load_agent_mapping():
+    """Load agent mapping from JSON file"""
+    if not AGENT_MAPPING_FILE.exists():
+        logger.warning("agent_mapping.json not found - using default mappings")
+    get_agent_mapping()
 
 load_agent_mapping()
 
@@ -126,6 +227,56 @@ class WebhookResponse(BaseModel):
     timestamp: str
 
 
+def webhook_reply(call_id: str, message: str, timestamp: str) -> JSONResponse:
+    """Build a webhook reply in the WebhookResponse shape
+    Returned as a ready response so FastAPI skips building the model and re-validating it
+    against response_model (the model still documents the shape in the OpenAPI schema)
+    """
+    return JSONResponse({'success': True, 'message': message, 'call_id': call_id, 'timestamp': timestamp})
+
+
+# Database statements - defined once so every call passes the identical string and
+# hits the connection's prepared-statement cache
+SQL_SELECT_CALL_STATE = (
+    "SELECT slack_posted, status, processed_at FROM processed_calls "
+    "INDEXED BY idx_call_state WHERE call_id = ?"
+)
+
+SQL_INSERT_PROCESSED = """
+    INSERT INTO processed_calls 
+    (call_id, from_number, to_number, duration, timestamp, processed_at, 
+     transcription_text, slack_posted, status)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# New call is inserted; a call that failed over an hour ago is flipped back to processing;
+# anything else (posted, in flight, recently failed) is left untouched
+SQL_CLAIM_CALL = SQL_INSERT_PROCESSED + """
+    ON CONFLICT(call_id) DO UPDATE 
+    SET status = 'processing', processed_at = excluded.processed_at, 
+        transcription_text = excluded.transcription_text
+    WHERE NOT IFNULL(slack_posted, 0) 
+      AND status IS NOT 'processing' 
+      AND processed_at < ?
+"""
+
+SQL_UPDATE_PROCESSED = """
+    UPDATE processed_calls 
+    SET transcription_text = ?, 
+        slack_posted = ?, 
+        status = ?,
+        processed_at = ?
+    WHERE call_id = ?
+"""
+
+SQL_CALL_STATS = """
+    SELECT COUNT(*),
+           COALESCE(SUM(slack_posted = 1), 0),
+           COALESCE(SUM(status = 'failed'), 0)
+    FROM processed_calls
+"""
+
+
 # Database Manager
 class DatabaseManager:
     """Manage SQLite database for duplicate prevention"""
@@ -133,29 +284,59 @@ class DatabaseManager:
     def __init__(self, db_path: str):
         self.db_path = db_path
         self.cache_file = "processed_calls_cache.json"
+        self._cache_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._write_lock = threading.Lock()
         self.processed_cache = self._load_cache()
+        self._local = threading.local()
+        self._connections = []
         self._init_database()
     
-    def _load_cache(self) -> set:
-        """Load processed call IDs from JSON file"""
+    def _load_cache(self) -> OrderedDict:
+        """Load processed call IDs from JSON file (most recent PROCESSED_CACHE_SIZE only)"""
         try:
             if os.path.exists(self.cache_file):
                 with open(self.cache_file, 'r') as f:
-                    data = json.load(f)
+                    data = json.load(f)[-PROCESSED_CACHE_SIZE:]
                     logger.info(f"📦 Loaded {len(data)} processed call IDs from cache file")
-                    return set(data)
+                    return OrderedDict.fromkeys(data)
         except Exception as e:
             logger.warning(f"⚠️ Could not load cache file: {e}")
-        return set()
+        return OrderedDict()
     
     def _save_cache(self):
         """Save processed call IDs to JSON file"""
         try:
-            with open(self.cache_file, 'w') as f:
-                json.dump(list(self.processed_cache), f)
+            # Serialize writers so concurrent saves don't interleave in the temp file
+            with self._save_lock:
+                with self._cache_lock:
+                    call_ids = list(self.processed_cache)
+                # Write compactly to a temp file and swap it in, so a crash mid-write can't
+                # leave a truncated cache that fails to load on restart
+                tmp_file = f"{self.cache_file}.tmp"
+                with open(tmp_file, 'w') as f:
+                    json.dump(call_ids, f, separators=(',', ':'))
+                os.replace(tmp_file, self.cache_file)
         except Exception as e:
             logger.error(f"❌ Could not save cache file: {e}")
     
+    def is_posted_cached(self, call_id: str) -> bool:
+        """Check the in-memory LRU of posted call IDs (no database read), refreshing recency on a hit"""
+        with self._cache_lock:
+            if call_id in self.processed_cache:
+                self.processed_cache.move_to_end(call_id)
+                return True
+            return False
+    
+    def _remember_processed(self, call_id: str):
+        """Add a posted call ID to the LRU, evicting the oldest beyond PROCESSED_CACHE_SIZE"""
+        with self._cache_lock:
+            self.processed_cache[call_id] = None
+            self.processed_cache.move_to_end(call_id)
+            while len(self.processed_cache) > PROCESSED_CACHE_SIZE:
+                self.processed_cache.popitem(last=False)
+        self._save_cache()
+    
     def _init_database(self):
         """Initialize database schema"""
         with self._get_connection() as conn:
@@ -172,57 +353,103 @@ class DatabaseManager:
                     status TEXT
                 )
             """)
+            # No query filters on timestamp; the index only cost an extra b-tree write per insert
+            conn.execute("DROP INDEX IF EXISTS idx_timestamp")
+            # Covering index for the per-call duplicate checks. The state columns sit behind
+            # transcription_text in the row, so reading them from the table walks the
+            # transcript's overflow pages; the queries below name this index explicitly
+            # because the planner otherwise prefers the primary-key autoindex
             conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_timestamp 
-                ON processed_calls(timestamp)
+                CREATE INDEX IF NOT EXISTS idx_call_state 
+                ON processed_calls(call_id, slack_posted, status, processed_at)
+            """)
+            # Covering index for get_stats - the counts scan this small index instead of
+            # rows whose status column sits behind the (large) transcription text.
+            # processed_at rides along so the startup cleanup of unposted rows seeks
+            # slack_posted = 0 and filters on age without touching the table
+            conn.execute("DROP INDEX IF EXISTS idx_slack_status")
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_slack_status_time 
+                ON processed_calls(slack_posted, status, processed_at)
             """)
             conn.commit()
         logger.info(f"Database initialized at {self.db_path}")
     
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection tuned for the webhook workload"""
+        # Each connection is only used by the thread that opened it; check_same_thread
+        # is relaxed so close() can release them all from the shutdown handler
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # WAL lets readers run alongside a writer; NORMAL sync is safe with WAL
+        # and avoids an fsync on every commit
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-20000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")
+        return conn
+    
     @contextmanager
     def _get_connection(self):
-        """Context manager for database connections"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """Context manager for database connections
+        Reuses one long-lived connection per thread so the page cache stays warm
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            with self._cache_lock:
+                self._connections.append(conn)
         try:
             yield conn
-        finally:
+        except Exception:
+            conn.rollback()
+            raise
+    
+    @contextmanager
+    def _write_transaction(self):
+        """Run a read-check-write sequence as one BEGIN IMMEDIATE transaction
+        Takes the write lock up front so concurrent webhooks can't both pass the
+        duplicate check, and commits everything with a single fsync.
+        Writers in this process queue on a Python lock rather than SQLite's
+        sleep-and-poll busy handler; readers stay lock-free under WAL.
+        """
+        with self._write_lock, self._get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.commit()
+    
+    def close(self):
+        """Close every per-thread connection (called on shutdown)"""
+        with self._cache_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
             conn.close()
     
     def is_call_processed(self, call_id: str) -> bool:
         """Check if call has been successfully posted to Slack"""
         # Check in-memory cache first (fastest, survives restarts via JSON file)
-        if call_id in self.processed_cache:
+        if self.is_posted_cached(call_id):
             logger.info(f"✅ Call {call_id} found in memory cache - DUPLICATE BLOCKED")
             return True
         
         with self._get_connection() as conn:
             # Check if call was ever successfully posted to Slack (regardless of time)
+            # call_id is the primary key, so a single probe returns the only possible row
             logger.info(f"🔍 Layer 1 Check: Querying database for call_id={call_id}")
-            result = conn.execute(
-                "SELECT call_id, slack_posted, processed_at FROM processed_calls WHERE call_id = ? AND slack_posted = 1",
-                (call_id,)
-            ).fetchone()
-            
-            # Also check what's actually in the database for this call_id
-            all_records = conn.execute(
-                "SELECT call_id, slack_posted, status, processed_at FROM processed_calls WHERE call_id = ?",
-                (call_id,)
-            ).fetchall()
+            record = conn.execute(SQL_SELECT_CALL_STATE, (call_id,)).fetchone()
             
-            if all_records:
-                logger.info(f"🔍 Found {len(all_records)} record(s) for call {call_id}:")
-                for record in all_records:
-                    logger.info(f"   - slack_posted={record[1]} (type: {type(record[1])}), status={record[2]}, processed_at={record[3]}")
+            if record:
+                logger.info(f"🔍 Found record for call {call_id}:")
+                logger.info(f"   - slack_posted={record[0]} (type: {type(record[0])}), status={record[1]}, processed_at={record[2]}")
             else:
                 logger.info(f"🔍 No records found in database for call {call_id}")
             
-            if result:
-                processed_at = result[2] if result[2] else 'unknown'
+            if record and record[0] == 1:
+                processed_at = record[2] if record[2] else 'unknown'
                 logger.info(f"✅ Call {call_id} already successfully posted to Slack at {processed_at}")
                 # Add to cache for faster future lookups
-                self.processed_cache.add(call_id)
-                self._save_cache()
+                self._remember_processed(call_id)
                 return True
             logger.info(f"❌ Call {call_id} NOT found with slack_posted=1")
             return False
@@ -232,99 +459,73 @@ class DatabaseManager:
         Returns True if successfully marked, False if already exists
         BULLETPROOF: No call will ever be processed twice
         """
-        with self._get_connection() as conn:
-            # Check if call already exists (any status, any time)
-            existing = conn.execute(
-                "SELECT call_id, slack_posted, status, processed_at FROM processed_calls WHERE call_id = ?",
-                (call_id,)
-            ).fetchone()
-            
-            if existing:
-                call_status = existing[2] if existing[2] else 'unknown'
-                slack_posted = existing[1] if existing[1] else False
-                processed_at = existing[3] if existing[3] else 'unknown'
-                
-                # Block if call was already posted to Slack (PERMANENT BLOCK)
-                if slack_posted:
-                    logger.warning(f"🚫 PERMANENT DUPLICATE BLOCK: {call_id}")
-                    logger.warning(f"   Status: {call_status}")
-                    logger.warning(f"   Slack Posted: {slack_posted}")
-                    logger.warning(f"   Processed At: {processed_at}")
-                    logger.warning(f"   BLOCKING: Call already posted to Slack (Zapier polling detected)")
-                    return False
-                
-                # Block if call is currently being processed (RACE CONDITION PREVENTION)
-                if call_status == 'processing':
-                    logger.warning(f"🚫 PROCESSING DUPLICATE BLOCK: {call_id}")
-                    logger.warning(f"   Status: {call_status}")
-                    logger.warning(f"   Processed At: {processed_at}")
-                    logger.warning(f"   BLOCKING: Call currently being processed")
-                    return False
-                
-                # Call exists but failed - allow retry only if it's been more than 1 hour
-                one_hour_ago = (datetime.utcnow() - timedelta(hours=1)).isoformat()
-                if processed_at < one_hour_ago:
-                    logger.info(f"🔄 RETRYING FAILED CALL: {call_id}")
-                    logger.info(f"   Previous Status: {call_status}")
-                    logger.info(f"   Previous Slack Posted: {slack_posted}")
-                    logger.info(f"   Previous Processed At: {processed_at}")
-                    # Update the existing record to processing
-                    conn.execute("""
-                        UPDATE processed_calls 
-                        SET status = 'processing', processed_at = ?, transcription_text = 'Processing...'
-                        WHERE call_id = ?
-                    """, (datetime.utcnow().isoformat(), call_id))
-                    conn.commit()
-                    logger.info(f"🔄 RETRY LOCK: Marked call {call_id} as processing (retry)")
-                    return True
-                else:
-                    # Call failed recently - block retry
-                    logger.warning(f"🚫 RECENT FAILURE BLOCK: {call_id}")
-                    logger.warning(f"   Previous Status: {call_status}")
-                    logger.warning(f"   Processed At: {processed_at}")
-                    logger.warning(f"   BLOCKING: Call failed recently, wait 1 hour before retry")
-                    return False
-            
-            # Insert new call as processing with BULLETPROOF locking
-            conn.execute("""
-                INSERT INTO processed_calls 
-                (call_id, from_number, to_number, duration, timestamp, processed_at, 
-                 transcription_text, slack_posted, status)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+        now = datetime.utcnow()
+        now_iso = now.isoformat()
+        
+        one_hour_ago = (now - timedelta(hours=1)).isoformat()
+        
+        with self._write_transaction() as conn:
+            # One UPSERT expresses the whole state machine in a single statement
+            cursor = conn.execute(SQL_CLAIM_CALL, (
                 call_id,
                 call_data['from_number'],
                 call_data['to_number'],
                 call_data['duration'],
-                call_data.get('timestamp', datetime.utcnow().isoformat()),
-                datetime.utcnow().isoformat(),
+                call_data.get('timestamp', now_iso),
+                now_iso,
                 'Processing...',
                 False,
-                'processing'
+                'processing',
+                one_hour_ago
             ))
-            conn.commit()
-        logger.info(f"🔒 BULLETPROOF LOCK: Marked call {call_id} as processing")
-        return True
+            
+            if cursor.rowcount == 1:
+                logger.info(f"🔒 BULLETPROOF LOCK: Marked call {call_id} as processing")
+                return True
+            
+            # Blocked - read the row back only to report why
+            existing = conn.execute(SQL_SELECT_CALL_STATE, (call_id,)).fetchone()
+        
+        slack_posted = existing[0] if existing[0] else False
+        call_status = existing[1] if existing[1] else 'unknown'
+        processed_at = existing[2] if existing[2] else 'unknown'
+        
+        # Block if call was already posted to Slack (PERMANENT BLOCK)
+        if slack_posted:
+            logger.warning(f"🚫 PERMANENT DUPLICATE BLOCK: {call_id}")
+            logger.warning(f"   Status: {call_status}")
+            logger.warning(f"   Slack Posted: {slack_posted}")
+            logger.warning(f"   Processed At: {processed_at}")
+            logger.warning(f"   BLOCKING: Call already posted to Slack (Zapier polling detected)")
+            # Answer the next repeat from memory
+            self._remember_processed(call_id)
+        # Block if call is currently being processed (RACE CONDITION PREVENTION)
+        elif call_status == 'processing':
+            logger.warning(f"🚫 PROCESSING DUPLICATE BLOCK: {call_id}")
+            logger.warning(f"   Status: {call_status}")
+            logger.warning(f"   Processed At: {processed_at}")
+            logger.warning(f"   BLOCKING: Call currently being processed")
+        # Call failed recently - block retry
+        else:
+            logger.warning(f"🚫 RECENT FAILURE BLOCK: {call_id}")
+            logger.warning(f"   Previous Status: {call_status}")
+            logger.warning(f"   Processed At: {processed_at}")
+            logger.warning(f"   BLOCKING: Call failed recently, wait 1 hour before retry")
+        return False
     
     def mark_call_processed(self, call_data: Dict[str, Any], transcription: str, success: bool):
         """Mark call as processed"""
         call_id = call_data['call_id']
         logger.info(f"📝 Marking call {call_id} as processed: success={success} (type: {type(success)})")
+        now_iso = datetime.utcnow().isoformat()
         
-        with self._get_connection() as conn:
+        with self._write_transaction() as conn:
             # Try UPDATE first to preserve slack_posted flag if record exists
-            cursor = conn.execute("""
-                UPDATE processed_calls 
-                SET transcription_text = ?, 
-                    slack_posted = ?, 
-                    status = ?,
-                    processed_at = ?
-                WHERE call_id = ?
-            """, (
+            cursor = conn.execute(SQL_UPDATE_PROCESSED, (
                 transcription,
                 success,
                 'completed' if success else 'failed',
-                datetime.utcnow().isoformat(),
+                now_iso,
                 call_id
             ))
             
@@ -334,38 +535,27 @@ class DatabaseManager:
             # If UPDATE didn't affect any rows, INSERT new record
             if rows_updated == 0:
                 logger.info(f"📝 No existing record found, INSERTing new record")
-                conn.execute("""
-                    INSERT INTO processed_calls 
-                    (call_id, from_number, to_number, duration, timestamp, processed_at, 
-                     transcription_text, slack_posted, status)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
+                conn.execute(SQL_INSERT_PROCESSED, (
                     call_id,
                     call_data['from_number'],
                     call_data['to_number'],
                     call_data['duration'],
-                    call_data.get('timestamp', datetime.utcnow().isoformat()),
-                    datetime.utcnow().isoformat(),
+                    call_data.get('timestamp', now_iso),
+                    now_iso,
                     transcription,
                     success,
                     'completed' if success else 'failed'
                 ))
                 logger.info(f"📝 INSERT completed for call {call_id}")
             
-            conn.commit()
-            
             # Verify what was actually stored
-            verify = conn.execute(
-                "SELECT slack_posted, status FROM processed_calls WHERE call_id = ?",
-                (call_id,)
-            ).fetchone()
+            verify = conn.execute(SQL_SELECT_CALL_STATE, (call_id,)).fetchone()
             if verify:
                 logger.info(f"📝 Verification: slack_posted={verify[0]} (type: {type(verify[0])}), status={verify[1]}")
             
         # Add to persistent cache if successfully posted
         if success:
-            self.processed_cache.add(call_id)
-            self._save_cache()
+            self._remember_processed(call_id)
             logger.info(f"📦 Added call {call_id} to persistent cache")
         
         logger.info(f"Marked call {call_id} as processed")
@@ -373,13 +563,8 @@ class DatabaseManager:
     def get_stats(self) -> Dict[str, int]:
         """Get processing statistics"""
         with self._get_connection() as conn:
-            total = conn.execute("SELECT COUNT(*) FROM processed_calls").fetchone()[0]
-            posted = conn.execute(
-                "SELECT COUNT(*) FROM processed_calls WHERE slack_posted = 1"
-            ).fetchone()[0]
-            failed = conn.execute(
-                "SELECT COUNT(*) FROM processed_calls WHERE status = 'failed'"
-            ).fetchone()[0]
+            # One pass over the table instead of three separate COUNT scans
+            total, posted, failed = conn.execute(SQL_CALL_STATS).fetchone()
             
             return {
                 'total_processed': total,
@@ -392,6 +577,35 @@ class DatabaseManager:
 db_manager = DatabaseManager(DATABASE_PATH)
 
 
+class StreamingMultipartBody:
+    """multipart/form-data request body that streams the file part from a chunk iterator"""
+    
+    def __init__(self, fields: Dict[str, str], file_field: str, filename: str, file_type: str,
+                 chunks, file_size: Optional[int] = None):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        
+        head = ''.join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            for name, value in fields.items()
+        )
+        head += (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+            f'Content-Type: {file_type}\r\n\r\n'
+        )
+        self.head = head.encode('utf-8')
+        self.tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        self.chunks = chunks
+        
+        # requests reads `len` to send a Content-Length; None falls back to chunked encoding
+        self.len = len(self.head) + file_size + len(self.tail) if file_size is not None else None
+    
+    def __iter__(self):
+        yield self.head
+        yield from self.chunks
+        yield self.tail
+
+
 # Transcription Service using OpenAI Whisper
 class TranscriptionService:
     """Handle audio transcription using OpenAI Whisper"""
@@ -402,22 +616,105 @@ class TranscriptionService:
         self.headers = {
             "Authorization": f"Bearer {self.api_key}"
         }
+        self.form_fields = {
+            'model': 'whisper-1',
+            'language': 'en',
+            'response_format': 'json'
+        }
+        # Keep-alive session so Exotel/OpenAI connections are reused across calls
+        # (headers stay per-request so the OpenAI key is never sent to Exotel)
+        self.session = make_session()
+    
+    def transcribe_recording(self, recording_url: str, call_id: str) -> str:
+        """Transcribe an Exotel recording, streaming it straight into Whisper
+        
+        The download is piped into the upload body so the MP3 never touches disk.
+        Only on a retryable failure (network error, 429, 5xx) do we fall back to
+        buffering the recording in downloads/ and uploading it from there.
+        """
+        try:
+            return self._transcribe_stream(recording_url, call_id)
+        except requests.exceptions.RequestException as e:
+            status = e.response.status_code if e.response is not None else None
+            if status is not None and status != 429 and status < 500:
+                logger.error(f"❌ Streamed transcription failed for call {call_id}: {e}")
+                raise
+            logger.warning(f"⚠️ Streamed transcription failed for call {call_id} ({e}) - retrying via disk buffer")
+        
+        audio_file = self.download_recording(recording_url, call_id)
+        return self.transcribe_audio(audio_file)
+    
+    def _transcribe_stream(self, recording_url: str, call_id: str) -> str:
+        """Pipe the Exotel download directly into the Whisper upload"""
+        logger.info("Streaming recording from Exotel to OpenAI Whisper...")
+        
+        auth = (EXOTEL_API_KEY, EXOTEL_API_TOKEN) if EXOTEL_API_KEY else None
+        
+        with self.session.get(recording_url, auth=auth, timeout=60, stream=True) as download:
+            download.raise_for_status()
+            
+            # Content-Length is only the body size when the response isn't content-encoded
+            content_length = download.headers.get('Content-Length')
+            file_size = int(content_length) if content_length and 'Content-Encoding' not in download.headers else None
+            
+            body = StreamingMultipartBody(
+                self.form_fields,
+                'file',
+                f"{call_id}.mp3",
+                'audio/mpeg',
+                download.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE),
+                file_size
+            )
+            response = self.session.post(
+                self.api_url,
+                headers={**self.headers, 'Content-Type': body.content_type},
+                data=body,
+                timeout=120
+            )
+        
+        return self._parse_transcription(response)
+    
+    def _parse_transcription(self, response: requests.Response) -> str:
+        """Extract transcription text from a Whisper response"""
+        response.raise_for_status()
+        result = response.json()
+        
+        transcription = result.get('text', '')
+        
+        if transcription:
+            logger.info(f"✅ Transcription completed: {len(transcription)} characters")
+            return transcription
+        
+        raise Exception("No transcription text returned from OpenAI Whisper")
+    
+    @staticmethod
+    def _recording_path(call_id: str) -> Path:
+        """Local path of the buffered recording for a call"""
+        return Path("downloads") / f"{call_id}.mp3"
     
     def download_recording(self, recording_url: str, call_id: str) -> str:
-        """Download recording from Exotel"""
+        """Download recording from Exotel (streamed to disk in chunks)"""
         try:
-            downloads_dir = Path("downloads")
-            downloads_dir.mkdir(exist_ok=True)
-            
-            file_path = downloads_dir / f"{call_id}.mp3"
+            file_path = self._recording_path(call_id)
+            file_path.parent.mkdir(exist_ok=True)
+            partial_path = file_path.with_suffix('.part')
             
             auth = (EXOTEL_API_KEY, EXOTEL_API_TOKEN) if EXOTEL_API_KEY else None
             
-            response = requests.get(recording_url, auth=auth, timeout=60)
-            response.raise_for_status()
+            try:
+                with self.session.get(recording_url, auth=auth, timeout=60, stream=True) as response:
+                    response.raise_for_status()
+                    
+                    with open(partial_path, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                            f.write(chunk)
+            except Exception:
+                partial_path.unlink(missing_ok=True)
+                raise
             
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
+            # Only a fully written file gets the final name, so an interrupted download never
+            # leaves a truncated .mp3 behind
+            os.replace(partial_path, file_path)
             
             logger.info(f"Downloaded recording to {file_path}")
             return str(file_path)
@@ -432,81 +729,37 @@ class TranscriptionService:
             logger.info("Transcribing audio with OpenAI Whisper...")
             
             with open(audio_file_path, 'rb') as audio_file:
-                files = {
-                    'file': (os.path.basename(audio_file_path), audio_file, 'audio/mpeg')
-                }
-                data = {
-                    'model': 'whisper-1',
-                    'language': 'en',
-                    'response_format': 'json'
-                }
-                
-                response = requests.post(
+                # Stream the file in chunks; files= would build the whole multipart body in memory
+                body = StreamingMultipartBody(
+                    self.form_fields,
+                    'file',
+                    os.path.basename(audio_file_path),
+                    'audio/mpeg',
+                    iter(lambda: audio_file.read(DOWNLOAD_CHUNK_SIZE), b''),
+                    os.fstat(audio_file.fileno()).st_size
+                )
+                response = self.session.post(
                     self.api_url,
-                    headers=self.headers,
-                    files=files,
-                    data=data,
+                    headers={**self.headers, 'Content-Type': body.content_type},
+                    data=body,
                     timeout=120
                 )
             
-            response.raise_for_status()
-            result = response.json()
-            
-            transcription = result.get('text', '')
-            
-            if transcription:
-                logger.info(f"✅ Transcription completed: {len(transcription)} characters")
-                return transcription
-            
-            raise Exception("No transcription text returned from OpenAI Whisper")
+            return self._parse_transcription(response)
             
         except Exception as e:
             logger.error(f"❌ OpenAI Whisper transcription error: {e}")
             raise
         finally:
             try:
-                if os.path.exists(audio_file_path):
-                    os.remove(audio_file_path)
-                    logger.info(f"Cleaned up audio file: {audio_file_path}")
-            except Exception as e:
+                Path(audio_file_path).unlink(missing_ok=True)
+                logger.info(f"Cleaned up audio file: {audio_file_path}")
+            except OSError as e:
                 logger.warning(f"Failed to cleanup audio file: {e}")
 
 
-# MOM Generator Service
-class MOMGenerator:
-    """Generate Meeting Minutes from transcription using OpenAI"""
-    
-    def __init__(self, api_key: str):
-        self.api_key = api_key
-        self.api_url = "https://api.openai.com/v1/chat/completions"
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-    
-    def generate_mom(self, transcription: str, customer_name: str = "Customer", agent_name: str = "Agent") -> str:
-        """Generate structured Meeting Minutes from transcription with retry logic
-        
-        Args:
-            transcription: The call transcript text
-            customer_name: Name of the customer (from Google Sheets or phone number)
-            agent_name: Name of the agent (from agent database)
-        """
-        max_retries = 3
-        base_delay = 2
-        
-        for attempt in range(max_retries):
-            try:
-                if attempt > 0:
-                    delay = base_delay * (2 ** attempt)
-                    logger.info(f"Retry attempt {attempt + 1}/{max_retries} after {delay}s delay...")
-                    time.sleep(delay)
-                
-                logger.info(f"Generating MOM from transcription (attempt {attempt + 1}/{max_retries})...")
-                logger.info(f"   Customer: {customer_name}")
-                logger.info(f"   Agent: {agent_name}")
-                
-                prompt = f"""You are an expert at creating concise Meeting Minutes (MOM) for customer support calls.
+# MOM prompt - built once at import, filled per call with str.format_map
+MOM_PROMPT_TEMPLATE = """You are an expert at creating concise Meeting Minutes (MOM) for customer support calls.
 
 CRITICAL SPEAKER INFORMATION:
 - Customer Name: {customer_name}
@@ -586,34 +839,100 @@ Transcription:
 
 Create the MOM in a clear, professional format with actual conversation content."""
 
-                payload = {
-                    "model": "gpt-3.5-turbo",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": f"You are a professional customer support analyst who creates detailed meeting minutes. CRITICAL: In Key Discussion Points, write in natural narrative format WITHOUT explicit speaker labels. Identify the speaker naturally within each sentence (e.g., 'Agent confirmed...' or 'Customer asked...'). Paraphrase professionally while retaining all context. Clean up filler words and casual speech to make it polished. Example: '- Agent confirmed verification for Maksud Ariba Allay and identified a minor discrepancy.' or '- Customer asked for confirmation on when the report will be ready.'. DO NOT use 'Customer:' or 'Agent (Name):' prefixes. DO NOT use quote marks. ALWAYS include Tone, Mood Analysis, and Concern Type fields."
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": 800
+MOM_SYSTEM_MESSAGE = "You are a professional customer support analyst who creates detailed meeting minutes. CRITICAL: In Key Discussion Points, write in natural narrative format WITHOUT explicit speaker labels. Identify the speaker naturally within each sentence (e.g., 'Agent confirmed...' or 'Customer asked...'). Paraphrase professionally while retaining all context. Clean up filler words and casual speech to make it polished. Example: '- Agent confirmed verification for Maksud Ariba Allay and identified a minor discrepancy.' or '- Customer asked for confirmation on when the report will be ready.'. DO NOT use 'Customer:' or 'Agent (Name):' prefixes. DO NOT use quote marks. ALWAYS include Tone, Mood Analysis, and Concern Type fields."
+
+
+# MOM Generator Service
+class MOMGenerator:
+    """Generate Meeting Minutes from transcription using OpenAI"""
+    
+    def __init__(self, api_key: str, session: Optional[requests.Session] = None):
+        self.api_key = api_key
+        self.api_url = "https://api.openai.com/v1/chat/completions"
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        # Keep-alive session; passing the transcription session lets the MOM request reuse the
+        # api.openai.com connection left open by the Whisper upload (headers stay per-request)
+        self.session = session or make_session()
+    
+    @staticmethod
+    def _read_stream(response: requests.Response) -> str:
+        """Assemble the completion text from a chat completions SSE stream"""
+        parts = []
+        for line in response.iter_lines():
+            if not line.startswith(b'data: '):
+                continue
+            data = line[6:]
+            if data == b'[DONE]':
+                break
+            choices = json.loads(data).get('choices')
+            if choices:
+                content = choices[0].get('delta', {}).get('content')
+                if content:
+                    parts.append(content)
+        return ''.join(parts)
+    
+    def generate_mom(self, transcription: str, customer_name: str = "Customer", agent_name: str = "Agent") -> str:
+        """Generate structured Meeting Minutes from transcription with retry logic
+        
+        Args:
+            transcription: The call transcript text
+            customer_name: Name of the customer (from Google Sheets or phone number)
+            agent_name: Name of the agent (from agent database)
+        """
+        max_retries = 3
+        base_delay = 2
+        
+        # Prompt and request body are identical on every attempt - build them once
+        prompt = MOM_PROMPT_TEMPLATE.format_map({
+            'customer_name': customer_name,
+            'agent_name': agent_name,
+            'transcription': transcription
+        })
+        payload = {
+            "model": "gpt-3.5-turbo",
+            "messages": [
+                {
+                    "role": "system",
+                    "content": MOM_SYSTEM_MESSAGE
+                },
+                {
+                    "role": "user",
+                    "content": prompt
                 }
+            ],
+            "temperature": 0.3,
+            "max_tokens": 800,
+            # Stream tokens so the 30s read timeout applies between chunks,
+            # not to the whole completion
+            "stream": True
+        }
+        body = encode_json(payload)
+        
+        for attempt in range(max_retries):
+            try:
+                if attempt > 0:
+                    delay = base_delay * (2 ** attempt)
+                    logger.info(f"Retry attempt {attempt + 1}/{max_retries} after {delay}s delay...")
+                    time.sleep(delay)
+                
+                logger.info(f"Generating MOM from transcription (attempt {attempt + 1}/{max_retries})...")
+                logger.info(f"   Customer: {customer_name}")
+                logger.info(f"   Agent: {agent_name}")
                 
-                response = requests.post(
+                with self.session.post(
                     self.api_url,
                     headers=self.headers,
-                    json=payload,
-                    timeout=30
-                )
-                
-                response.raise_for_status()
-                result = response.json()
+                    data=body,
+                    timeout=30,
+                    stream=True
+                ) as response:
+                    response.raise_for_status()
+                    mom = self._read_stream(response).strip()
                 
-                if 'choices' in result and len(result['choices']) > 0:
-                    mom = result['choices'][0]['message']['content'].strip()
+                if mom:
                     logger.info(f"✅ MOM generated successfully: {len(mom)} characters")
                     return mom
                 
@@ -652,7 +971,7 @@ Create the MOM in a clear, professional format with actual conversation content.
 The call was regarding a customer support inquiry. The conversation lasted {len(transcription)} characters.
 
 **Transcription:**
-{transcription[:400] if len(transcription) > 400 else transcription}
+{transcription[:400]}
 
 **Note:** Automated MOM generation temporarily unavailable (OpenAI rate limit). This is a direct transcription of the call.
 
@@ -668,29 +987,49 @@ The call was regarding a customer support inquiry. The conversation lasted {len(
 class GoogleDriveService:
     """Upload transcript files to Google Drive for automatic NotebookLM sync"""
     
+    SCOPES = ['https://www.googleapis.com/auth/drive.file']
+    TOKEN_FILE = Path('token.json')
+    LEGACY_TOKEN_FILE = Path('token.pickle')
+    # Above this size (bytes) uploads use a resumable session instead of one multipart request
+    SIMPLE_UPLOAD_LIMIT = 5 * 1024 * 1024
+    FILENAME_TRANS = str.maketrans({':': '-', ' ': '_'})
+    
     def __init__(self, client_id: str = None, client_secret: str = None):
         self.client_id = client_id
         self.client_secret = client_secret
         self.service = None
         self.folder_id = None
+        # Set once setup fails for a reason a retry can't fix (no libraries / no token),
+        # so later calls go straight to the local file fallback
+        self.unavailable = False
+    
+    def _load_credentials(self):
+        """Load saved OAuth credentials from token.json (migrating a legacy token.pickle once)"""
+        from google.oauth2.credentials import Credentials
+        
+        if self.TOKEN_FILE.exists():
+            return Credentials.from_authorized_user_file(str(self.TOKEN_FILE), self.SCOPES)
+        
+        if self.LEGACY_TOKEN_FILE.exists():
+            import pickle
+            with open(self.LEGACY_TOKEN_FILE, 'rb') as token:
+                creds = pickle.load(token)
+            self.TOKEN_FILE.write_text(creds.to_json())
+            logger.info(f"Migrated {self.LEGACY_TOKEN_FILE} to {self.TOKEN_FILE}")
+            return creds
+        
+        return None
         
     def setup_drive_service(self):
         """Initialize Google Drive API service"""
+        if self.unavailable:
+            return False
         try:
-            from google.oauth2.credentials import Credentials
-            from google_auth_oauthlib.flow import InstalledAppFlow
             from google.auth.transport.requests import Request
             from googleapiclient.discovery import build
-            import pickle
-            import os
-            
-            SCOPES = ['https://www.googleapis.com/auth/drive.file']
             
-            creds = None
-            # Check if token.pickle exists
-            if os.path.exists('token.pickle'):
-                with open('token.pickle', 'rb') as token:
-                    creds = pickle.load(token)
+            SCOPES = self.SCOPES
+            creds = self._load_credentials()
             
             # If no valid credentials, get new ones
             if not creds or not creds.valid:
@@ -713,14 +1052,15 @@ class GoogleDriveService:
                         )
                         # For server deployment, we'll use a different approach
                         logger.warning("Google Drive OAuth requires manual setup - using local file fallback")
+                        self.unavailable = True
                         return False
                     else:
                         logger.warning("Google Drive credentials not found - file upload disabled")
+                        self.unavailable = True
                         return False
                 
                 # Save credentials for next run
-                with open('token.pickle', 'wb') as token:
-                    pickle.dump(creds, token)
+                self.TOKEN_FILE.write_text(creds.to_json())
             
             self.service = build('drive', 'v3', credentials=creds)
             
@@ -730,6 +1070,7 @@ class GoogleDriveService:
             
         except ImportError:
             logger.warning("Google Drive libraries not installed - file upload disabled")
+            self.unavailable = True
             return False
         except Exception as e:
             logger.error(f"Failed to setup Google Drive service: {e}")
@@ -740,8 +1081,9 @@ class GoogleDriveService:
         try:
             # Search for existing folder
             results = self.service.files().list(
-                q="name='Exotel Transcripts' and mimeType='application/vnd.google-apps.folder'",
-                fields="files(id, name)"
+                q="name='Exotel Transcripts' and mimeType='application/vnd.google-apps.folder' and trashed=false",
+                fields="files(id)",
+                pageSize=1
             ).execute()
             
             folders = results.get('files', [])
@@ -806,7 +1148,7 @@ END OF TRANSCRIPT - {call_id}
                     return self._save_local_file(structured_transcript, call_id, timestamp)
             
             # Upload to Google Drive
-            filename = f"transcript_{call_id}_{timestamp.replace(':', '-').replace(' ', '_')}.txt"
+            filename = self._transcript_filename(call_id, timestamp)
             
             # Create file metadata
             file_metadata = {
@@ -814,22 +1156,38 @@ END OF TRANSCRIPT - {call_id}
                 'parents': [self.folder_id] if self.folder_id else []
             }
             
-            # Create media upload
-            from googleapiclient.http import MediaIoBaseUpload
-            import io
+            # Create media upload - transcripts are small, so a single multipart POST beats
+            # a resumable session (initiate + upload round trips); only huge ones go resumable
+            from googleapiclient.http import MediaInMemoryUpload
             
-            media = MediaIoBaseUpload(
-                io.BytesIO(structured_transcript.encode('utf-8')),
+            content = structured_transcript.encode('utf-8')
+            media = MediaInMemoryUpload(
+                content,
                 mimetype='text/plain',
-                resumable=True
+                resumable=len(content) > self.SIMPLE_UPLOAD_LIMIT
             )
             
             # Upload file
-            file = self.service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id'
-            ).execute()
+            from googleapiclient.errors import HttpError
+            try:
+                file = self.service.files().create(
+                    body=file_metadata,
+                    media_body=media,
+                    fields='id'
+                ).execute()
+            except HttpError as e:
+                # The folder ID is resolved once per process - if the folder was deleted since,
+                # look it up (or recreate it) and retry once
+                if e.resp.status != 404 or not self.folder_id:
+                    raise
+                logger.warning(f"Drive folder {self.folder_id} not found - resolving it again")
+                self.folder_id = self._create_or_find_folder()
+                file_metadata['parents'] = [self.folder_id] if self.folder_id else []
+                file = self.service.files().create(
+                    body=file_metadata,
+                    media_body=media,
+                    fields='id'
+                ).execute()
             
             file_id = file.get('id')
             logger.info(f"📚 Transcript uploaded to Google Drive: {filename}")
@@ -845,11 +1203,15 @@ END OF TRANSCRIPT - {call_id}
             logger.info("Falling back to local file storage...")
             return self._save_local_file(structured_transcript, call_id, timestamp)
     
+    @staticmethod
+    def _transcript_filename(call_id: str, timestamp: str) -> str:
+        """Transcript file name, with the timestamp made filesystem-safe in one translate() pass"""
+        return f"transcript_{call_id}_{timestamp.translate(GoogleDriveService.FILENAME_TRANS)}.txt"
+    
     def _save_local_file(self, structured_transcript: str, call_id: str, timestamp: str) -> bool:
         """Fallback method to save transcript locally"""
         try:
-            import os
-            filename = f"transcript_{call_id}_{timestamp.replace(':', '-').replace(' ', '_')}.txt"
+            filename = self._transcript_filename(call_id, timestamp)
             filepath = f"transcripts/{filename}"
             
             # Create transcripts directory if it doesn't exist
@@ -873,24 +1235,29 @@ END OF TRANSCRIPT - {call_id}
 class SlackUserLookup:
     """Query Slack workspace to find user info by phone number"""
     
+    # Seconds before the workspace user list is reloaded (and before a failed load is retried)
+    CACHE_TTL = 600
+    RETRY_AFTER = 60
+    PAGE_SIZE = 200
+    
     def __init__(self, bot_token: Optional[str]):
         self.bot_token = bot_token
         self.users_cache = {}
+        self.users_by_email = {}
         self.cache_loaded = False
+        self.next_refresh = 0.0
+        self._refresh_lock = threading.Lock()
+        self.session = make_session()
+        if bot_token:
+            self.session.headers.update({"Authorization": f"Bearer {bot_token}"})
     
     def normalize_phone(self, phone: str) -> str:
         """Normalize phone number for comparison"""
-        normalized = ''.join(filter(str.isdigit, phone))
-        # Remove country code +91
-        if normalized.startswith('91') and len(normalized) == 12:
-            normalized = normalized[2:]
-        # Remove leading 0
-        if normalized.startswith('0') and len(normalized) == 11:
-            normalized = normalized[1:]
-        return normalized
+        # Slack profile phones are free text, so drop every non-digit in one C-level pass
+        return normalize_phone(_NON_DIGITS.sub('', phone))
     
     def load_users(self) -> bool:
-        """Load all users from Slack workspace"""
+        """Load all users from Slack workspace (paginated users.list)"""
         if not self.bot_token:
             logger.warning("Slack bot token not configured - cannot lookup users")
             return False
@@ -898,37 +1265,54 @@ class SlackUserLookup:
         try:
             logger.info("Loading users from Slack workspace...")
             
-            response = requests.get(
-                "https://slack.com/api/users.list",
-                headers={"Authorization": f"Bearer {self.bot_token}"},
-                timeout=10
-            )
-            
-            response.raise_for_status()
-            data = response.json()
-            
-            if not data.get('ok'):
-                logger.error(f"Slack API error: {data.get('error')}")
-                return False
-            
-            for member in data.get('members', []):
-                if member.get('deleted') or member.get('is_bot'):
-                    continue
+            # Build fresh indexes and swap them in at the end, so lookups never see a half-loaded cache
+            users_cache = {}
+            users_by_email = {}
+            cursor = None
+            while True:
+                params = {"limit": self.PAGE_SIZE}
+                if cursor:
+                    params["cursor"] = cursor
+                response = self.session.get(
+                    "https://slack.com/api/users.list",
+                    params=params,
+                    timeout=10
+                )
+                
+                response.raise_for_status()
+                data = response.json()
                 
-                profile = member.get('profile', {})
-                phone = profile.get('phone', '')
+                if not data.get('ok'):
+                    logger.error(f"Slack API error: {data.get('error')}")
+                    return False
                 
-                if phone:
-                    normalized_phone = self.normalize_phone(phone)
-                    self.users_cache[normalized_phone] = {
+                for member in data.get('members', []):
+                    if member.get('deleted') or member.get('is_bot'):
+                        continue
+                    
+                    profile = member.get('profile', {})
+                    phone = profile.get('phone', '')
+                    email = profile.get('email', '')
+                    user = {
                         'name': profile.get('real_name', profile.get('display_name', 'Unknown')),
                         'slack_handle': member.get('name', 'unknown'),
                         'user_id': member.get('id', ''),  # SLACK USER ID FOR TAGGING
-                        'email': profile.get('email', ''),
+                        'email': email,
                         'title': profile.get('title', ''),
                         'department': profile.get('fields', {}).get('department', 'Customer Success')
                     }
+                    
+                    if phone:
+                        users_cache[self.normalize_phone(phone)] = user
+                    if email:
+                        users_by_email[email.lower()] = user
+                
+                cursor = data.get('response_metadata', {}).get('next_cursor')
+                if not cursor:
+                    break
             
+            self.users_cache = users_cache
+            self.users_by_email = users_by_email
             self.cache_loaded = True
             logger.info(f"✅ Loaded {len(self.users_cache)} users from Slack workspace")
             return True
@@ -937,10 +1321,31 @@ class SlackUserLookup:
             logger.error(f"Failed to load Slack users: {e}")
             return False
     
+    def _ensure_users(self):
+        """Load the user list on first use and reload it once CACHE_TTL has passed"""
+        if time.monotonic() < self.next_refresh:
+            return
+        with self._refresh_lock:
+            # Another worker may have refreshed while we waited for the lock
+            if time.monotonic() < self.next_refresh:
+                return
+            loaded = self.load_users()
+            self.next_refresh = time.monotonic() + (self.CACHE_TTL if loaded else self.RETRY_AFTER)
+    
+    def get_user_by_email(self, email: str) -> Optional[Dict[str, str]]:
+        """Look up user in Slack by email address"""
+        self._ensure_users()
+        
+        user = self.users_by_email.get(email.lower())
+        
+        if user:
+            logger.info(f"📧 Found Slack user: {user['name']} ({user['email']}) - Will tag as <@{user['user_id']}>")
+        
+        return user
+    
     def get_user_by_phone(self, phone: str) -> Optional[Dict[str, str]]:
         """Look up user in Slack by phone number"""
-        if not self.cache_loaded:
-            self.load_users()
+        self._ensure_users()
         
         normalized = self.normalize_phone(phone)
         user = self.users_cache.get(normalized)
@@ -954,21 +1359,44 @@ class SlackUserLookup:
 slack_user_lookup = SlackUserLookup(SLACK_BOT_TOKEN) if SLACK_BOT_TOKEN else None
 
 
+# Slack message layout - built once, filled per call with str.format_map
+SLACK_MESSAGE_TEMPLATE = """{title_emoji} *{title_text}*
+
+*Customer Details*
+• Name: {customer_legal_name}
+• Number: `{customer_number}`
+
+*Agent Details*
+• Agent: {agent_name} {agent_mention}
+• Number: `{agent_phone}`
+• Department: {department}
+
+*Call Duration & Time*
+• Time: {timestamp_formatted}
+• Duration: {duration_formatted}
+
+*Summary*
+{content_section}
+
+*Resources*
+• Recording: {recording_display}
+• Call ID: `{call_id}`"""
+
+
 # Slack Formatter
 class SlackFormatter:
     """Format call data for Slack posting with smart agent detection"""
     
+    # Shared keep-alive session so the TLS connection to hooks.slack.com is reused across posts
+    session = make_session()
+    # Last post time per webhook URL, so bursts are spaced out instead of tripping Slack's 429s
+    _post_lock = threading.Lock()
+    _last_post = {}
+    
     @staticmethod
     def normalize_phone(phone: str) -> str:
         """Normalize phone number for comparison"""
-        normalized = phone.replace('+', '').replace('-', '').replace(' ', '').replace('(', '').replace(')', '')
-        # Remove country code +91
-        if normalized.startswith('91') and len(normalized) == 12:
-            normalized = normalized[2:]
-        # Remove leading 0
-        if normalized.startswith('0') and len(normalized) == 11:
-            normalized = normalized[1:]
-        return normalized
+        return normalize_phone(phone)
     
     @staticmethod
     def find_agent_from_call(from_number: str, to_number: str, extra_number: str = None, phone_number_sid: str = None) -> Optional[Dict[str, str]]:
@@ -988,41 +1416,42 @@ class SlackFormatter:
 
         logger.debug(f"🔍 Checking for agent match in: {candidates}")
         
-        # Check agent_mapping.json database
-        for mapped_phone, agent_data in AGENT_MAPPING.items():
-            mapped_clean = SlackFormatter.normalize_phone(mapped_phone)
-            
-            for candidate_phone, direction in candidates:
-                if not candidate_phone:
-                    continue
-                    
-                candidate_clean = SlackFormatter.normalize_phone(candidate_phone)
-                
-                if mapped_clean == candidate_clean:
-                    email = agent_data.get('email', '')
-                    name = agent_data.get('name', 'Support Agent')
-                    
-                    # Try to enrich with Slack info if available
-                    slack_mention = f"📧 {email}" if email else "@support"
-                    user_id = ""
-                    if slack_user_lookup:
-                        # try looking up by the matched phone
-                        slack_user = slack_user_lookup.get_user_by_phone(mapped_phone)
-                        if slack_user:
-                            user_id = slack_user.get('user_id', '')
-                            slack_mention = f"<@{user_id}>" if user_id else slack_mention
-
-                    logger.info(f"✅ Found authorized agent ({candidate_phone}): {name}")
-                    return {
-                        "phone": candidate_phone,
-                        "name": name,
-                        "slack_mention": slack_mention,
-                        "email": email,
-                        "user_id": user_id,
-                        "department": agent_data.get('department', 'CUSTOMER SUPPORT'),
-                        "team": agent_data.get('team', 'Support'),
-                        "direction": direction
-                    }
+        # Check agent_mapping.json database (pre-normalized index, one lookup per candidate)
+        agent_mapping, phone_index = get_agent_mapping()
+        for candidate_phone, direction in candidates:
+            if not candidate_phone:
+                continue
+            
+            mapped_phone = phone_index.get(normalize_phone(candidate_phone))
+            if mapped_phone is None:
+                continue
+            
+            agent_data = agent_mapping[mapped_phone]
+            email = agent_data.get('email', '')
+            name = agent_data.get('name', 'Support Agent')
+            
+            # Try to enrich with Slack info if available
+            slack_mention = f"📧 {email}" if email else "@support"
+            user_id = ""
+            if slack_user_lookup:
+                # Prefer the agent's email (stable across profile edits), then the matched phone
+                slack_user = (email and slack_user_lookup.get_user_by_email(email)) or \
+                    slack_user_lookup.get_user_by_phone(mapped_phone)
+                if slack_user:
+                    user_id = slack_user.get('user_id', '')
+                    slack_mention = f"<@{user_id}>" if user_id else slack_mention
+
+            logger.info(f"✅ Found authorized agent ({candidate_phone}): {name}")
+            return {
+                "phone": candidate_phone,
+                "name": name,
+                "slack_mention": slack_mention,
+                "email": email,
+                "user_id": user_id,
+                "department": agent_data.get('department', 'CUSTOMER SUPPORT'),
+                "team": agent_data.get('team', 'Support'),
+                "direction": direction
+            }
         
         return None
     
@@ -1075,29 +1504,28 @@ class SlackFormatter:
             direction = "incoming"  # Default assumption
         
         # Format timestamp - CONVERT TO IST
-        timestamp = call_data.get('timestamp', datetime.utcnow().isoformat())
+        timestamp = call_data.get('timestamp') or ''
         
-        # Default to UTC now
-        dt_ist = datetime.utcnow() + timedelta(hours=5, minutes=30)
+        dt_ist = None
         
         try:
             if 'T' in timestamp:
                 # ISO Format (UTC): "2026-01-06T13:02:33.989386Z"
                 # Parse as UTC, then convert to IST
                 dt_utc = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                dt_ist = dt_utc + timedelta(hours=5, minutes=30)
+                dt_ist = dt_utc + IST_OFFSET
             elif ' ' in timestamp:
                 # Exotel/Zapier Format (Likely ALREADY IST): "2025-11-07 11:31:02"
                 # Assuming this is local time (IST), so keep as is
-                dt_ist = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
-            else:
-                # Fallback
-                dt_ist = datetime.utcnow() + timedelta(hours=5, minutes=30)
+                dt_ist = datetime.strptime(timestamp, EXOTEL_TIME_FORMAT)
         except Exception as e:
             logger.warning(f"⚠️ Timestamp parsing error: {e}. Using current IST time.")
+        
+        if dt_ist is None:
+            # Default to current IST time (also used when no timestamp was supplied)
+            dt_ist = datetime.utcnow() + IST_OFFSET
             
         timestamp_formatted = dt_ist.strftime('%Y-%m-%d %H:%M:%S IST')
-        date_only = dt_ist.strftime('%Y-%m-%d')
         
         duration_sec = call_data.get('duration', 0)
         duration_formatted = f"{duration_sec}s ({int(duration_sec // 60)}m {duration_sec % 60}s)"
@@ -1128,8 +1556,9 @@ class SlackFormatter:
                 title_text = "Voicemail Received"
                 
                 # Show raw transcription for true voicemails
-                if mom and len(mom) > 10:
-                    short_transcription = mom[:1500] + "..." if len(mom) > 1500 else mom
+                mom_length = len(mom) if mom else 0
+                if mom_length > 10:
+                    short_transcription = mom[:1500] + "..." if mom_length > 1500 else mom
                     content_section = f"📝 *Voicemail Transcription:*\n\n{short_transcription}"
                 else:
                     content_section = f"📝 *Voicemail recorded.* Check recording link below (Transcription unavailable or too short)."
@@ -1147,29 +1576,22 @@ class SlackFormatter:
         exotel_link = call_data.get('recording_url', 'N/A')
         recording_display = f"<{exotel_link}|Listen on Exotel>" if exotel_link != 'N/A' else 'None'
         
-        # Main message body - clean and focused
         # Main message body - Professional & Clean
-        message = f"""{title_emoji} *{title_text}*
-
-*Customer Details*
-• Name: {customer_legal_name}
-• Number: `{customer_number}`
-
-*Agent Details*
-• Agent: {agent_name} {agent_mention}
-• Number: `{agent_phone}`
-• Department: {department}
-
-*Call Duration & Time*
-• Time: {timestamp_formatted}
-• Duration: {duration_formatted}
-
-*Summary*
-{content_section}
-
-*Resources*
-• Recording: {recording_display}
-• Call ID: `{call_data['call_id']}`"""
+        message = SLACK_MESSAGE_TEMPLATE.format_map({
+            'title_emoji': title_emoji,
+            'title_text': title_text,
+            'customer_legal_name': customer_legal_name,
+            'customer_number': customer_number,
+            'agent_name': agent_name,
+            'agent_mention': agent_mention,
+            'agent_phone': agent_phone,
+            'department': department,
+            'timestamp_formatted': timestamp_formatted,
+            'duration_formatted': duration_formatted,
+            'content_section': content_section,
+            'recording_display': recording_display,
+            'call_id': call_data['call_id']
+        })
         
         return {
             'message': message,
@@ -1182,6 +1604,29 @@ class SlackFormatter:
             'mom': mom  # Store MOM separately for potential future use
         }
     
+    @staticmethod
+    def _wait_for_post_slot(webhook_url: str):
+        """Block until SLACK_MIN_INTERVAL_MS has passed since the last post to this webhook"""
+        if SLACK_MIN_INTERVAL_MS <= 0:
+            return
+        # Reserve this post's slot under the lock, then sleep outside it - a burst to one
+        # webhook still leaves one post per interval without holding up other webhooks
+        with SlackFormatter._post_lock:
+            now = time.monotonic()
+            slot = max(now, SlackFormatter._last_post.get(webhook_url, 0.0) + SLACK_MIN_INTERVAL_MS / 1000)
+            SlackFormatter._last_post[webhook_url] = slot
+        if slot > now:
+            time.sleep(slot - now)
+    
+    @staticmethod
+    def _never_connected(error: requests.exceptions.ConnectionError) -> bool:
+        """True when the request failed before a connection existed, so nothing was sent"""
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        # requests wraps urllib3's MaxRetryError, whose reason says what actually failed
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+    
     @staticmethod
     def post_to_slack(message_data: Dict[str, Any], webhook_url: str) -> bool:
         """Post formatted message to Slack
@@ -1190,36 +1635,62 @@ class SlackFormatter:
             message_data: Dict containing 'message' and other metadata
             webhook_url: Slack webhook URL
         """
-        try:
-            main_message = message_data['message']
-            
-            # Post message via webhook
-            payload = {
-                "text": main_message,
-                "mrkdwn": True,
-                "unfurl_links": False,
-                "unfurl_media": False
-            }
-            
-            response = requests.post(
-                webhook_url,
-                json=payload,
-                headers={'Content-Type': 'application/json'},
-                timeout=10
-            )
-            response.raise_for_status()
-            
-            logger.info("✅ Successfully posted message to Slack")
-            return True
-            
-        except Exception as e:
-            logger.error(f"❌ Failed to post to Slack: {e}")
-            return False
+        max_retries = 3
+        base_delay = 1
+        
+        for attempt in range(max_retries):
+            try:
+                main_message = message_data['message']
+                
+                # Post message via webhook
+                payload = {
+                    "text": main_message,
+                    "mrkdwn": True,
+                    "unfurl_links": False,
+                    "unfurl_media": False
+                }
+                
+                SlackFormatter._wait_for_post_slot(webhook_url)
+                response = SlackFormatter.session.post(
+                    webhook_url,
+                    data=encode_json(payload),
+                    headers={'Content-Type': 'application/json; charset=utf-8'},
+                    timeout=10
+                )
+                response.raise_for_status()
+                
+                logger.info("✅ Successfully posted message to Slack")
+                return True
+                
+            except (requests.exceptions.HTTPError, requests.exceptions.ConnectionError) as e:
+                # Only retry when Slack did not accept the message: a 429/5xx, or a connection that
+                # was never made (refused, DNS failure, connect timeout). A connection reset or read
+                # timeout after the request went out may already have posted, so it is not retried
+                if isinstance(e, requests.exceptions.HTTPError):
+                    status = e.response.status_code if e.response is not None else None
+                    retryable = status is None or status == 429 or status >= 500
+                else:
+                    retryable = SlackFormatter._never_connected(e)
+                if not retryable or attempt == max_retries - 1:
+                    logger.error(f"❌ Failed to post to Slack: {e}")
+                    return False
+                
+                retry_after = e.response.headers.get('Retry-After') if e.response is not None else None
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else base_delay * (2 ** attempt)
+                delay += random.uniform(0, base_delay)
+                logger.warning(f"⚠️ Slack post failed ({e}) - retry {attempt + 2}/{max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+                
+            except Exception as e:
+                logger.error(f"❌ Failed to post to Slack: {e}")
+                return False
+        
+        return False
 
 
 # Initialize services
 transcription_service = TranscriptionService(OPENAI_API_KEY) if OPENAI_API_KEY else None
-mom_generator = MOMGenerator(OPENAI_API_KEY) if OPENAI_API_KEY else None
+mom_generator = MOMGenerator(OPENAI_API_KEY, session=transcription_service.session) if OPENAI_API_KEY else None
 google_drive_service = GoogleDriveService(GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET) if GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET else None
 customer_lookup = CustomerLookup()  # Initialize customer lookup service
 
@@ -1251,14 +1722,14 @@ async def process_call_with_rate_limit(call_data: Dict[str, Any]):
     """Process call with rate limiting to prevent server overload"""
     call_id = call_data['call_id']
     
-    # Acquire semaphore (wait if max concurrent calls reached)
-    processing_semaphore.acquire()
+    # Concurrency is bounded by call_executor's worker count - each worker runs one call
     try:
         logger.info(f"[Queue] Starting processing for call {call_id}")
         call_type = call_data.get('call_type', 'Normal')
         
         transcription = ""
         mom = ""
+        drive_upload = None
         
         # Determine if we should transcribe
         should_transcribe = False
@@ -1280,13 +1751,10 @@ async def process_call_with_rate_limit(call_data: Dict[str, Any]):
             # Check if recording URL is provided
             recording_url = call_data.get('recording_url')
             if recording_url:
-                # Download and transcribe
+                # Stream the recording into Whisper and transcribe
                 try:
-                    logger.info(f"Downloading recording for call {call_id}")
-                    audio_file = transcription_service.download_recording(recording_url, call_id)
-                    
                     logger.info(f"Transcribing call {call_id}")
-                    transcription = transcription_service.transcribe_audio(audio_file)
+                    transcription = transcription_service.transcribe_recording(recording_url, call_id)
                     
                     if not transcription:
                         transcription = "No transcription possible."
@@ -1296,49 +1764,65 @@ async def process_call_with_rate_limit(call_data: Dict[str, Any]):
             else:
                 transcription = "No recording available."
             
-            # Generate MOM for all calls with an identified agent (Normal or Voicemail Call with agent)
-            # Only skip MOM generation for true voicemails (no agent)
-            agent_info = SlackFormatter.find_agent_from_call(
-                call_data['from_number'],
-                call_data['to_number'],
-                call_data.get('exotel_to'),
-                call_data.get('phone_number_sid')
-            )
+            # Upload transcript to Google Drive for automatic NotebookLM sync (only if transcription exists and it's a normal call)
+            # Runs in parallel with MOM generation so the two network round trips overlap
+            if google_drive_service and call_type == "Normal" and transcription and "N/A" not in transcription and "Error" not in transcription:
+                logger.info(f"Uploading transcript to Google Drive for call {call_id}")
+                drive_upload = asyncio.create_task(
+                    asyncio.to_thread(google_drive_service.send_transcript, transcription, call_data)
+                )
             
-            should_generate_mom = (
-                agent_info is not None and 
-                transcription and 
-                "Error" not in transcription
-            )
+            try:
+                # Generate MOM for all calls with an identified agent (Normal or Voicemail Call with agent)
+                # Only skip MOM generation for true voicemails (no agent)
+                agent_info = SlackFormatter.find_agent_from_call(
+                    call_data['from_number'],
+                    call_data['to_number'],
+                    call_data.get('exotel_to'),
+                    call_data.get('phone_number_sid')
+                )
             
-            if should_generate_mom:
-                # Determine customer number based on agent detection
-                if agent_info['direction'] == "outgoing":
-                    customer_number = call_data['to_number']
-                else:
-                    customer_number = call_data['from_number']
-                agent_name = agent_info['name']
+                # Misdials and near-silent calls don't need an OpenAI round trip - post the raw text instead
+                should_generate_mom = (
+                    agent_info is not None and 
+                    transcription and 
+                    "Error" not in transcription and
+                    len(transcription.strip()) >= MIN_MOM_TRANSCRIPT_CHARS
+                )
+            
+                if should_generate_mom:
+                    # Determine customer number based on agent detection
+                    if agent_info['direction'] == "outgoing":
+                        customer_number = call_data['to_number']
+                    else:
+                        customer_number = call_data['from_number']
+                    agent_name = agent_info['name']
                 
-                # For MOM generation, use simple labels
-                customer_name_for_mom = "Customer"
-                agent_name_for_mom = agent_name
+                    # For MOM generation, use simple labels
+                    customer_name_for_mom = "Customer"
+                    agent_name_for_mom = agent_name
                 
-                if mom_generator and transcription:
-                    logger.info(f"Generating MOM for call {call_id}")
-                    mom = mom_generator.generate_mom(transcription, customer_name=customer_name_for_mom, agent_name=agent_name_for_mom)
+                    if mom_generator and transcription:
+                        logger.info(f"Generating MOM for call {call_id}")
+                        mom = await asyncio.to_thread(
+                            mom_generator.generate_mom,
+                            transcription,
+                            customer_name=customer_name_for_mom,
+                            agent_name=agent_name_for_mom
+                        )
+                    else:
+                        mom = transcription
                 else:
-                    mom = transcription
-            else:
-                # For voicemail calls, use the transcription directly (no MOM generation)
-                mom = transcription if transcription and "Error" not in transcription else "N/A"
+                    # For voicemail and very short calls, use the transcription directly (no MOM generation)
+                    mom = transcription if transcription and "Error" not in transcription else "N/A"
+            finally:
+                # Await the upload even when agent lookup or MOM generation raised, so it is never
+                # left running unawaited on this worker's persistent event loop
+                if drive_upload:
+                    await drive_upload
         else:
             transcription = "Voicemail (Check Link)"
             mom = "N/A"
-
-        # Upload transcript to Google Drive for automatic NotebookLM sync (only if transcription exists and it's a normal call)
-        if google_drive_service and call_type == "Normal" and transcription and "N/A" not in transcription and "Error" not in transcription:
-            logger.info(f"Uploading transcript to Google Drive for call {call_id}")
-            google_drive_service.send_transcript(transcription, call_data)
         
         # BULLETPROOF DUPLICATE PREVENTION - Layer 3: Final safety check before Slack post
         if db_manager.is_call_processed(call_id):
@@ -1378,20 +1862,23 @@ async def process_call_with_rate_limit(call_data: Dict[str, Any]):
     except Exception as e:
         logger.error(f"❌ Error processing call {call_id}: {e}")
         db_manager.mark_call_processed(call_data, f"Error: {str(e)}", False)
-    finally:
-        processing_semaphore.release()
+
+
+# One event loop per call worker thread, created on its first call and reused for every
+# call after it (closed on shutdown) instead of building and tearing down a loop per call
+_worker_local = threading.local()
+_worker_loops = []
 
 
 def process_call_background(call_data: Dict[str, Any]):
     """Wrapper to run async processing in background"""
     try:
-        # Create a new event loop for this thread
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(process_call_with_rate_limit(call_data))
-        finally:
-            loop.close()
+        loop = getattr(_worker_local, 'loop', None)
+        if loop is None:
+            loop = _worker_local.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            _worker_loops.append(loop)
+        loop.run_until_complete(process_call_with_rate_limit(call_data))
     except Exception as e:
         logger.error(f"Error in background processing wrapper: {e}")
 
@@ -1412,7 +1899,7 @@ async def root():
             "Duplicate Prevention",
             "IST Timezone Support"
         ],
-        "agents_loaded": len(AGENT_MAPPING),
+        "agents_loaded": len(get_agent_mapping()[0]),
         "endpoints": {
             "health": "/health",
             "zapier_webhook": "/webhook/zapier",
@@ -1431,7 +1918,7 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "database": "connected",
-        "agents_loaded": len(AGENT_MAPPING),
+        "agents_loaded": len(get_agent_mapping()[0]),
         "stats": stats,
         "services": {
             "transcription": "enabled (OpenAI Whisper)" if transcription_service else "disabled",
@@ -1439,7 +1926,7 @@ async def health_check():
             "google_drive": "enabled" if google_drive_service else "disabled (set GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET)",
             "slack": "enabled" if SLACK_WEBHOOK_URL else "disabled",
             "slack_user_lookup": "enabled" if slack_user_lookup else "disabled (set SLACK_BOT_TOKEN)",
-            "agent_database": f"{len(AGENT_MAPPING)} agents loaded"
+            "agent_database": f"{len(get_agent_mapping()[0])} agents loaded"
         }
     }
 
@@ -1468,66 +1955,48 @@ async def code_version_check():
 @app.post("/webhook/exotel", response_model=WebhookResponse)
 @app.post("/webhook/zapier", response_model=WebhookResponse)
 async def exotel_webhook(
-    request: Request,
-    background_tasks: BackgroundTasks
+    request: Request
 ):
     """Main webhook endpoint for Exotel integration (formerly Zapier)"""
     try:
+        # One clock read per request, shared by the age checks and every response timestamp
+        now = datetime.utcnow()
+        response_timestamp = now.isoformat() + "Z"
+        
         # Parse JSON body
         body_json = await request.json()
-        logger.info(f"📥 Webhook body: {json.dumps(body_json, indent=2)}")
+        
+        # Fast path for repeat webhooks: an in-memory hit on the raw Sid skips validation,
+        # call-type detection and SQLite entirely
+        raw_call_id = (body_json.get('Sid') or body_json.get('call_id')) if isinstance(body_json, dict) else None
+        if isinstance(raw_call_id, str) and db_manager.is_posted_cached(raw_call_id):
+            logger.warning(f"🚫 PERMANENT DUPLICATE CALL DETECTED (memory cache): {raw_call_id}")
+            return webhook_reply(raw_call_id, "Duplicate call - already posted to Slack (layer 1)", response_timestamp)
+        
+        # Per-request diagnostics go to DEBUG with lazy %-formatting, so they cost nothing
+        # at the default INFO level; the body dump is guarded since json.dumps runs eagerly
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"📥 Webhook body: {json.dumps(body_json, indent=2)}")
         
         # Validate payload
         payload = ExotelWebhookPayload(**body_json)
         
         call_id = payload.call_id
-        logger.info(f"📞 Received webhook for call {call_id}")
-        logger.info(f"   From: {payload.from_number}")
-        logger.info(f"   To: {payload.to_number}")
-        logger.info(f"   Direction: {payload.direction}")
-        logger.info(f"   Price: {payload.price}")
-        
-        # Define virtual number for Customer Support
-        VIRTUAL_NUMBER = "08047190155"
-        
-        # Helper function to normalize phone numbers for comparison
-        def normalize_for_comparison(phone: str) -> str:
-            if not phone:
-                return ""
-            normalized = phone.replace('+', '').replace('-', '').replace(' ', '').replace('(', '').replace(')', '')
-            # Remove country code +91
-            if normalized.startswith('91') and len(normalized) == 12:
-                normalized = normalized[2:]
-            # Remove leading 0
-            if normalized.startswith('0') and len(normalized) == 11:
-                normalized = normalized[1:]
-            return normalized
-        
-        # Collect all phone fields and normalize them
+        logger.debug("📞 Received webhook for call %s (From: %s, To: %s, Direction: %s, Price: %s)",
+                     call_id, payload.from_number, payload.to_number, payload.direction, payload.price)
+        
+        # Collect all phone fields and normalize them (memoized module function, no per-request closure)
         all_fields = [
-            normalize_for_comparison(payload.from_number),
-            normalize_for_comparison(payload.to_number),
-            normalize_for_comparison(payload.exotel_to) if payload.exotel_to else "",
-            normalize_for_comparison(payload.phone_number_sid) if payload.phone_number_sid else ""
+            normalize_phone(phone) if phone else ""
+            for phone in (payload.from_number, payload.to_number, payload.exotel_to, payload.phone_number_sid)
         ]
         
-        # Normalize virtual number for comparison
-        normalized_virtual = normalize_for_comparison(VIRTUAL_NUMBER)
-        
-        # Count how many fields contain the virtual number
-        virtual_count = sum(1 for field in all_fields if field and field == normalized_virtual)
-        
-        # Check if any field contains an agent number
-        has_agent_number = False
-        for field in all_fields:
-            if field:
-                # Check against all 13 agent numbers
-                for agent_phone in AGENT_MAPPING.keys():
-                    if normalize_for_comparison(agent_phone) == field:
-                        has_agent_number = True
-                        break
-            if has_agent_number:
-                break
+        # Count how many fields contain the virtual number (exact match on normalized numbers)
+        virtual_count = sum(1 for field in all_fields if field and field == NORMALIZED_VIRTUAL_NUMBER)
+        
+        # Check if any field contains an agent number (hash lookup on the pre-normalized index)
+        _, phone_index = get_agent_mapping()
+        has_agent_number = any(field and field in phone_index for field in all_fields)
         
         # NEW CALL TYPE DETECTION LOGIC
         call_type = None
@@ -1535,12 +2004,12 @@ async def exotel_webhook(
         # Rule 1: If virtual number appears in 2+ fields → Voicemail
         if virtual_count >= 2:
             call_type = "Voicemail Call"
-            logger.info(f"   📠 Virtual number found in {virtual_count} fields → Voicemail Call")
+            logger.debug("   📠 Virtual number found in %s fields → Voicemail Call", virtual_count)
         
         # Rule 2: If has agent number + virtual number + status=completed → Normal
         elif has_agent_number and virtual_count >= 1 and payload.status == "completed":
             call_type = "Normal"
-            logger.info(f"   📞 Agent number + Virtual number + Completed → Normal Call")
+            logger.debug("   📞 Agent number + Virtual number + Completed → Normal Call")
         
         # Rule 3: Skip if doesn't match either pattern
         else:
@@ -1553,113 +2022,59 @@ async def exotel_webhook(
                 skip_reason.append(f"Status={payload.status}")
             
             logger.info(f"⏭️ Skipping call {call_id} - {', '.join(skip_reason)}")
-            return WebhookResponse(
-                success=True,
-                message=f"Skipped - {', '.join(skip_reason)}",
-                call_id=call_id,
-                timestamp=datetime.utcnow().isoformat() + "Z"
-            )
+            return webhook_reply(call_id, f"Skipped - {', '.join(skip_reason)}", response_timestamp)
         
         # Additional filter for inbound calls: must have recording and duration > 10s
         if payload.direction == "inbound":
             if not payload.recording_url or payload.duration <= 10:
                 logger.info(f"⏭️ Skipping Inbound Call {call_id} - Duration {payload.duration}s <= 10s or No Recording")
-                return WebhookResponse(
-                    success=True,
-                    message="Skipped - Short/No Recording Inbound Call",
-                    call_id=call_id,
-                    timestamp=datetime.utcnow().isoformat() + "Z"
-                )
+                return webhook_reply(call_id, "Skipped - Short/No Recording Inbound Call", response_timestamp)
         
-        logger.info(f"   Detection Debug: Direction={payload.direction}, RecURL={'Present' if payload.recording_url else 'None'}, Price={payload.price}")
-        logger.info(f"   Detected Call Type: {call_type}")
+        logger.debug("   Detection Debug: Direction=%s, RecURL=%s, Price=%s, Call Type=%s",
+                     payload.direction, 'Present' if payload.recording_url else 'None', payload.price, call_type)
         
         # TIME-BASED DUPLICATE PREVENTION: Skip calls older than 35 minutes
         # Since duplicate webhooks arrive every 30 minutes, this blocks all duplicates
-        logger.info(f"⏰ TIME-BASED CHECK STARTING for call {call_id}")
+        # (the log text below is the marker /diagnostic/code-version looks for)
+        logger.debug("⏰ TIME-BASED CHECK STARTING for call %s", call_id)
+        # Age computed once here (in seconds) and reused by the time-window validation below
+        call_age_seconds = None
         try:
             call_date_str = payload.timestamp
-            logger.info(f"⏰ StartTime from webhook: '{call_date_str}' (type: {type(call_date_str)})")
+            logger.debug("⏰ StartTime from webhook: %r", call_date_str)
             
             if call_date_str:
-                # Parse call timestamp
-                if 'T' in call_date_str or '+' in call_date_str or call_date_str.count(':') == 3:
-                    call_date = datetime.fromisoformat(call_date_str.replace('Z', '+00:00'))
-                    call_time = call_date.replace(tzinfo=None)
-                elif ' ' in call_date_str:
-                    # Handle Exotel format: 2026-01-18 10:47:05
-                    call_time = datetime.strptime(call_date_str, '%Y-%m-%d %H:%M:%S')
-                else:
-                    call_time = datetime.fromisoformat(call_date_str)
+                call_time = parse_call_timestamp(call_date_str)
                 
-                # Calculate age of call
-                current_time = datetime.utcnow()
-                call_age_minutes = (current_time - call_time).total_seconds() / 60
+                # Calculate age of call - one subtraction, thresholds compared in seconds
+                call_age_seconds = (now - call_time).total_seconds()
                 
-                logger.info(f"⏰ Call age: {call_age_minutes:.1f} minutes (current UTC: {current_time}, call time: {call_time})")
+                logger.debug("⏰ Call age: %.1f minutes (current UTC: %s, call time: %s)", call_age_seconds / 60, now, call_time)
                 
                 # Skip if call is older than 35 minutes (duplicate webhook)
-                if call_age_minutes > 35:
+                if call_age_seconds > 35 * 60:
+                    call_age_minutes = call_age_seconds / 60
                     logger.warning(f"🚫 DUPLICATE BLOCKED: Call {call_id} is {call_age_minutes:.1f} minutes old (> 35 min threshold)")
-                    return WebhookResponse(
-                        success=True,
-                        message=f"Duplicate blocked - call age {call_age_minutes:.1f} minutes",
-                        call_id=call_id,
-                        timestamp=datetime.utcnow().isoformat() + "Z"
-                    )
-                else:
-                    logger.info(f"✅ Call age OK: {call_age_minutes:.1f} minutes (< 35 min threshold)")
+                    return webhook_reply(call_id, f"Duplicate blocked - call age {call_age_minutes:.1f} minutes", response_timestamp)
             else:
                 logger.warning(f"⚠️ No StartTime in webhook payload for call {call_id}, cannot check call age")
         except Exception as e:
             logger.error(f"❌ ERROR in time-based duplicate check for call {call_id}: {e}", exc_info=True)
 
 
-        # BULLETPROOF DUPLICATE PREVENTION - Layer 1: Quick existence check
-        if db_manager.is_call_processed(call_id):
-            logger.warning(f"🚫 PERMANENT DUPLICATE CALL DETECTED (Layer 1): {call_id}")
-            return WebhookResponse(
-                success=True,
-                message="Duplicate call - already posted to Slack (layer 1)",
-                call_id=call_id,
-                timestamp=datetime.utcnow().isoformat() + "Z"
-            )
+        # BULLETPROOF DUPLICATE PREVENTION - Layer 1 is the memory-cache fast path above; calls
+        # posted before that cache saw them are refused by the Layer 2 claim below
         
         # TIME VALIDATION: Only process calls from last 1 hour
-        try:
-            call_date_str = payload.timestamp
-            if call_date_str:
-                if 'T' in call_date_str or '+' in call_date_str or call_date_str.count(':') == 3:
-                    call_date = datetime.fromisoformat(call_date_str.replace('Z', '+00:00'))
-                    call_time = call_date.replace(tzinfo=None)
-                elif ' ' in call_date_str:
-                    # Handle Exotel format: 2026-01-02 19:08:36
-                    call_time = datetime.strptime(call_date_str, '%Y-%m-%d %H:%M:%S')
-                else:
-                    call_time = datetime.fromisoformat(call_date_str)
-                
-                current_time = datetime.utcnow()
-                time_difference = current_time - call_time
-                time_difference_abs = abs(time_difference.total_seconds())
-                hours_diff = time_difference_abs / 3600
-                
-                # Relaxed Check: 365 Days (8760 hours)
-                if hours_diff > 8760: 
-                    logger.warning(f"🚫 OLD/FUTURE CALL REJECTED: {call_id} (Diff: {hours_diff:.2f}h)")
-                    return WebhookResponse(
-                        success=True,
-                        message=f"Call rejected - time window error ({hours_diff:.2f} hours)",
-                        call_id=call_id,
-                        timestamp=datetime.utcnow().isoformat() + "Z"
-                    )
-        except Exception as e:
-            logger.warning(f"⚠️ Could not validate call timestamp: {e}")
+        # Relaxed Check: 365 Days (8760 hours)
+        if call_age_seconds is not None and abs(call_age_seconds) > 8760 * 3600:
+            hours_diff = abs(call_age_seconds) / 3600
+            logger.warning(f"🚫 OLD/FUTURE CALL REJECTED: {call_id} (Diff: {hours_diff:.2f}h)")
+            return webhook_reply(call_id, f"Call rejected - time window error ({hours_diff:.2f} hours)", response_timestamp)
         
         if not SLACK_WEBHOOK_URL:
             raise HTTPException(status_code=500, detail="Slack webhook not configured")
         
-        logger.info(f"   To (Field): {payload.exotel_to}")
-        
         # Authorization is now handled in the call type detection logic above
         # Calls reach this point only if they passed the virtual number / agent number checks
         
@@ -1668,10 +2083,10 @@ async def exotel_webhook(
         if call_type == "Voicemail Call":
             agent_name = "N/A"
             agent_team = "Support"
-            logger.info(f"✅ Processing voicemail call (Agent: N/A)")
         else:
-            # Normal call - identify the agent
-            agent_info = SlackFormatter.find_agent_from_call(
+            # Normal call - identify the agent (may hit the Slack users API, so keep it off the event loop)
+            agent_info = await asyncio.to_thread(
+                SlackFormatter.find_agent_from_call,
                 payload.from_number, 
                 payload.to_number,
                 payload.exotel_to,
@@ -1681,11 +2096,11 @@ async def exotel_webhook(
             if agent_info:
                 agent_name = agent_info.get('name', 'Unknown')
                 agent_team = agent_info.get('team', 'Support')
-                logger.info(f"✅ Identified agent: {agent_name} ({agent_team})")
+                logger.debug("✅ Identified agent: %s (%s)", agent_name, agent_team)
             else:
                 agent_name = "Unknown"
                 agent_team = "Support"
-                logger.info(f"✅ Processing call (no specific agent identified)")
+                logger.debug("✅ Processing call (no specific agent identified)")
 
         
         call_data = {
@@ -1694,7 +2109,7 @@ async def exotel_webhook(
             'to_number': payload.to_number,
             'duration': payload.duration,
             'recording_url': payload.recording_url,
-            'timestamp': payload.timestamp or datetime.utcnow().isoformat(),
+            'timestamp': payload.timestamp or now.isoformat(),
             'status': payload.status,
             'direction': payload.direction,
             'price': payload.price,
@@ -1709,23 +2124,24 @@ async def exotel_webhook(
         }
         
         # BULLETPROOF DUPLICATE PREVENTION - Layer 2: Database lock check
+        # (one atomic claim - also refuses calls already posted to Slack)
         if not db_manager.mark_call_processing(call_id, call_data):
-            return WebhookResponse(
-                success=True,
-                message="Duplicate call - already processing (layer 2)",
-                call_id=call_id,
-                timestamp=datetime.utcnow().isoformat() + "Z"
-            )
+            # A refused claim on a posted call lands it in the memory cache
+            if db_manager.is_posted_cached(call_id):
+                logger.warning(f"🚫 PERMANENT DUPLICATE CALL DETECTED (Layer 2): {call_id}")
+                message = "Duplicate call - already posted to Slack (layer 2)"
+            else:
+                # Either still processing or failed within the retry window -
+                # mark_call_processing logs which one
+                message = "Duplicate call - already processing or failed recently (layer 2)"
+            return webhook_reply(call_id, message, response_timestamp)
         
-        background_tasks.add_task(process_call_background, call_data)
-        logger.info(f"✅ Queued {call_type} for processing: {call_id}")
+        call_executor.submit(process_call_background, call_data)
+        # The one INFO line for an accepted call
+        logger.info(f"✅ Queued {call_type} for processing: {call_id} (agent: {agent_name})")
         
-        return WebhookResponse(
-            success=True,
-            message=f"{call_type} queued for processing",
-            call_id=call_id,
-            timestamp=datetime.utcnow().isoformat() + "Z"
-        )
+        # Processing continues after the response is sent
+        return webhook_reply(call_id, f"{call_type} queued for processing", response_timestamp)
         
     except HTTPException:
         raise
@@ -1741,7 +2157,7 @@ async def get_stats():
     stats = db_manager.get_stats()
     return {
         "stats": stats,
-        "agents_loaded": len(AGENT_MAPPING),
+        "agents_loaded": len(get_agent_mapping()[0]),
         "timestamp": datetime.utcnow().isoformat() + "Z"
     }
 
@@ -1788,6 +2204,20 @@ async def general_exception_handler(request: Request, exc: Exception):
     )
 
 
+async def refresh_customer_cache():
+    """Keep the customer sheet cache warm so call processing never waits on Sheets"""
+    # Reload a little before the lazy TTL in lookup_customer would expire, so the
+    # refresh happens here rather than on a call worker
+    interval = customer_lookup.cache_refresh_interval.total_seconds() * 0.9
+    while True:
+        await asyncio.to_thread(customer_lookup.refresh_cache)
+        await asyncio.sleep(interval)
+
+
+customer_refresh_task = None
+startup_cleanup_task = None  # Held so the running task isn't garbage-collected
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize on startup"""
@@ -1795,8 +2225,14 @@ async def startup_event():
     logger.info("Starting Exotel-Slack Complete System v2.0")
     logger.info("=" * 60)
     
-    # Emergency cleanup of old records
-    emergency_cleanup_old_records()
+    # Emergency cleanup of old records - runs on a thread so startup doesn't wait on the
+    # DELETE; it only touches unposted rows over 2 hours old, so new webhooks are unaffected
+    global startup_cleanup_task
+    startup_cleanup_task = asyncio.create_task(asyncio.to_thread(emergency_cleanup_old_records))
+
+    if customer_lookup.client:
+        global customer_refresh_task
+        customer_refresh_task = asyncio.create_task(refresh_customer_cache())
     logger.info(f"Database: {DATABASE_PATH}")
     logger.info(f"Agent Database: {len(AGENT_MAPPING)} agents loaded")
     logger.info(f"Transcription: {'Enabled (OpenAI Whisper)' if transcription_service else 'Disabled'}")
@@ -1804,6 +2240,7 @@ async def startup_event():
     logger.info(f"Google Drive: {'Enabled' if google_drive_service else 'Disabled (set GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET)'}")
     logger.info(f"Slack: {'Enabled' if SLACK_WEBHOOK_URL else 'Disabled'}")
     logger.info(f"Slack User Lookup: {'Enabled' if slack_user_lookup else 'Disabled (set SLACK_BOT_TOKEN)'}")
+    logger.info(f"Customer Lookup: {'Enabled (background refresh)' if customer_lookup.client else 'Disabled (set GOOGLE_SHEETS_CREDENTIALS)'}")
     logger.info(f"Support Number: {SUPPORT_NUMBER}")
     logger.info(f"Rate Limiting: {PROCESSING_DELAY}s delay, {MAX_CONCURRENT_CALLS} concurrent calls")
     logger.info(f"Smart Agent Detection: Enabled ✅")
@@ -1812,8 +2249,26 @@ async def startup_event():
     else:
         logger.info(f"🔍 Department Filter: DISABLED - Processing all departments")
     logger.info("=" * 60)
-    
-    Path("downloads").mkdir(exist_ok=True)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Finish queued calls, then close pooled HTTP connections on shutdown"""
+    # Let accepted calls complete so none are left stuck in 'processing'
+    if customer_refresh_task:
+        customer_refresh_task.cancel()
+    call_executor.shutdown(wait=True)
+    for loop in _worker_loops:
+        loop.close()
+    if transcription_service:
+        transcription_service.session.close()
+    if mom_generator:
+        mom_generator.session.close()
+    if slack_user_lookup:
+        slack_user_lookup.session.close()
+    SlackFormatter.session.close()
+    db_manager.close()
+    logger.info("🔌 Closed HTTP sessions and database connections")
 
 
 if __name__ == "__main__":
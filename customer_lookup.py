@@ -4,27 +4,49 @@ Customer Lookup Module - Fetches customer details from Google Sheets
 
 import logging
 import gspread
+from gspread.urls import DRIVE_FILES_API_V3_URL, SPREADSHEET_VALUES_BATCH_URL
 from google.oauth2.service_account import Credentials
 from typing import Dict, Optional
 import os
+import sys
 import json
+import threading
 from datetime import datetime, timedelta
+from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# Separator characters stripped from phone numbers in a single translate() pass
+_PHONE_STRIP = str.maketrans('', '', '+ -()')
+
+# Shortest normalized number treated as a real phone (anything shorter is skipped unprobed)
+MIN_PHONE_DIGITS = 7
+
+# Sheet columns read into each customer record, in the order rows are unpacked
+SHEET_COLUMNS = ('Company ID', 'Company Name', 'Company Status', 'CA Name', 'CA Email', 'CA Mobile')
+
 class CustomerLookup:
     """Lookup customer details from Google Sheets with auto-refresh."""
     
+    # Last sheet load, served on restart until refreshed - holds customer contact details,
+    # so it is written owner-only (0600) and can be moved off the working dir
+    SNAPSHOT_FILE = Path(os.getenv('CUSTOMER_CACHE_FILE', 'customer_cache.json'))
+    
     def __init__(self):
         self.spreadsheet_url = "https://docs.google.com/spreadsheets/d/1to5o5DEvH8PWyuo89Dht-g__VNJw4NGAEP15jvgkWgo/edit?gid=498627995#gid=498627995"
         self.spreadsheet_id = "1to5o5DEvH8PWyuo89Dht-g__VNJw4NGAEP15jvgkWgo"
         self.worksheet_name = "Customer POC"  # EXACT SHEET NAME WITH SPACE
         self.client = None
         self.cache = {}  # Cache customer data to reduce API calls
+        self.cache_by_last10 = {}  # Same records keyed by the last 10 digits (fallback match)
         self.cache_loaded = False
         self.last_cache_refresh = None  # Track when cache was last refreshed
+        self.last_modified_time = None  # Drive modifiedTime of the spreadsheet at the last load
         self.cache_refresh_interval = timedelta(minutes=30)  # Refresh every 30 minutes
+        self._refresh_lock = threading.Lock()  # One sheet reload at a time across call workers
         self._init_client()
+        if self.client:
+            self._load_snapshot()
     
     def _init_client(self):
         """Initialize Google Sheets client."""
@@ -59,7 +81,57 @@ class CustomerLookup:
     
     def normalize_phone(self, phone_number: str) -> str:
         """Normalize phone number for comparison (remove +, spaces, hyphens)."""
-        return phone_number.replace('+', '').replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
+        return phone_number.translate(_PHONE_STRIP)
+    
+    def _sheet_modified_time(self) -> Optional[str]:
+        """Drive modifiedTime of the spreadsheet (None if it can't be read)."""
+        try:
+            response = self.client.request(
+                'get',
+                f"{DRIVE_FILES_API_V3_URL}/{self.spreadsheet_id}",
+                params={'fields': 'modifiedTime', 'supportsAllDrives': True}
+            )
+            return response.json().get('modifiedTime')
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read spreadsheet modifiedTime: {e}")
+            return None
+    
+    def _fetch_sheet_values(self):
+        """Fetch every cell of the customer sheet as strings (header row first)."""
+        # One values.batchGet round trip - opening the spreadsheet and worksheet through
+        # gspread costs a metadata fetch each before the values are even requested
+        try:
+            response = self.client.request(
+                'get',
+                SPREADSHEET_VALUES_BATCH_URL % self.spreadsheet_id,
+                params={'ranges': f"'{self.worksheet_name}'"}
+            )
+            return response.json()['valueRanges'][0].get('values', [])
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read worksheet '{self.worksheet_name}' directly: {e}")
+        
+        logger.info(f"📊 Opening spreadsheet: {self.spreadsheet_id}")
+        
+        # Open the spreadsheet
+        spreadsheet = self.client.open_by_key(self.spreadsheet_id)
+        
+        logger.info("📋 Available worksheets:")
+        for sheet in spreadsheet.worksheets():
+            logger.info(f"   - '{sheet.title}' (ID: {sheet.id})")
+        
+        # Try to get worksheet by name first
+        try:
+            logger.info(f"📄 Trying to open worksheet by name: '{self.worksheet_name}'")
+            worksheet = spreadsheet.worksheet(self.worksheet_name)
+            logger.info(f"✅ Found worksheet by name: '{self.worksheet_name}'")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not find worksheet by name: {e}")
+            # Try by GID (498627995)
+            logger.info("📄 Trying to open worksheet by GID: 498627995")
+            worksheet = spreadsheet.get_worksheet_by_id(498627995)
+            logger.info(f"✅ Found worksheet by GID: '{worksheet.title}'")
+        
+        return worksheet.get_all_values()
     
     def load_customer_cache(self):
         """Load all customer data into cache for fast lookup."""
@@ -68,72 +140,26 @@ class CustomerLookup:
                 logger.warning("⚠️ Google Sheets client not initialized - cannot load customer data")
                 return False
             
-            logger.info(f"📊 Opening spreadsheet: {self.spreadsheet_id}")
-            
-            # Open the spreadsheet
-            spreadsheet = self.client.open_by_key(self.spreadsheet_id)
-            
-            logger.info("📋 Available worksheets:")
-            for sheet in spreadsheet.worksheets():
-                logger.info(f"   - '{sheet.title}' (ID: {sheet.id})")
-            
-            # Try to get worksheet by name first
-            try:
-                logger.info(f"📄 Trying to open worksheet by name: '{self.worksheet_name}'")
-                worksheet = spreadsheet.worksheet(self.worksheet_name)
-                logger.info(f"✅ Found worksheet by name: '{self.worksheet_name}'")
-            except Exception as e:
-                logger.warning(f"⚠️ Could not find worksheet by name: {e}")
-                # Try by GID (498627995)
-                logger.info("📄 Trying to open worksheet by GID: 498627995")
-                worksheet = spreadsheet.get_worksheet_by_id(498627995)
-                logger.info(f"✅ Found worksheet by GID: '{worksheet.title}'")
+            # Cheap probe first - an unedited sheet keeps the current cache and skips the download.
+            # Read before the fetch, so an edit landing mid-download triggers the next reload
+            modified_time = self._sheet_modified_time()
+            if self.cache_loaded and modified_time and modified_time == self.last_modified_time:
+                self.last_cache_refresh = datetime.utcnow()
+                logger.info(f"✅ Customer sheet unchanged since {modified_time} - keeping cached data")
+                return True
             
-            # Get all records
-            records = worksheet.get_all_records()
-            
-            logger.info(f"📋 Retrieved {len(records)} records from sheet")
-            
-            # Build cache with normalized phone numbers as keys
-            self.cache = {}
-            phone_count = 0
-            
-            for record in records:
-                ca_mobile = str(record.get('CA Mobile', '')).strip()
-                ca_name_raw = str(record.get('CA Name', '')).strip()
-                company_name = str(record.get('Company Name', '')).strip()
-                
-                if ca_mobile and company_name:
-                    # CA Mobile and CA Name can have multiple entries separated by commas
-                    phone_numbers = [p.strip() for p in ca_mobile.split(',')]
-                    ca_names = [n.strip() for n in ca_name_raw.split(',')]
-                    
-                    # Create individual mappings for each phone number with its corresponding CA name
-                    for idx, phone in enumerate(phone_numbers):
-                        if phone:  # Skip empty strings
-                            # Get the corresponding CA name (if available)
-                            # If there are fewer names than numbers, use the last name or empty string
-                            ca_name_for_phone = ca_names[idx] if idx < len(ca_names) else (ca_names[-1] if ca_names else '')
-                            
-                            customer_details = {
-                                'company_id': str(record.get('Company ID', '')),
-                                'company_name': company_name,
-                                'company_status': str(record.get('Company Status', '')),
-                                'ca_name': ca_name_for_phone,  # Only the specific CA name for this phone
-                                'ca_email': str(record.get('CA Email', '')),
-                                'ca_mobile': phone,  # Only this specific phone number
-                                'original_phone': phone
-                            }
-                            
-                            clean_number = self.normalize_phone(phone)
-                            self.cache[clean_number] = customer_details
-                            phone_count += 1
-                            logger.debug(f"  📞 Cached: {phone} → {company_name} ({ca_name_for_phone})")
+            # Plain strings, without get_all_records' per-cell number coercion and per-row header dict
+            values = self._fetch_sheet_values()
+            record_count = max(len(values) - 1, 0)
+            logger.info(f"📋 Retrieved {record_count} records from sheet")
             
+            phone_count = self._build_cache(values)
             self.cache_loaded = True
+            self.last_modified_time = modified_time
             self.last_cache_refresh = datetime.utcnow()  # Record refresh time
-            logger.info(f"✅ Loaded {phone_count} phone number mappings from {len(records)} companies in Google Sheets")
+            logger.info(f"✅ Loaded {phone_count} phone number mappings from {record_count} companies in Google Sheets")
             logger.info(f"🕐 Cache refresh timestamp: {self.last_cache_refresh.strftime('%Y-%m-%d %H:%M:%S UTC')}")
+            self._save_snapshot(values, modified_time)
             return True
             
         except Exception as e:
@@ -142,6 +168,126 @@ class CustomerLookup:
             logger.error(f"   Worksheet Name: '{self.worksheet_name}'")
             return False
     
+    def _build_cache(self, values) -> int:
+        """Index sheet values (header row first) by phone and swap them in; returns the phone count."""
+        header = values[0] if values else []
+        records = values[1:]
+        
+        # Column positions resolved once from the header (a missing column reads as '')
+        columns = [header.index(name) if name in header else None for name in SHEET_COLUMNS]
+        
+        # Build cache with normalized phone numbers as keys - into fresh dicts that are
+        # swapped in at the end, so lookups during a refresh keep hitting the old data
+        cache = {}
+        cache_by_last10 = {}
+        local_numbers = {}  # 10-digit number -> record stored under its 91-prefixed form
+        phone_count = 0
+        log_rows = logger.isEnabledFor(logging.DEBUG)  # Checked once, not per phone
+        
+        for row in records:
+            company_id, company_name, company_status, ca_name_raw, ca_email, ca_mobile = (
+                row[i] if i is not None and i < len(row) else '' for i in columns
+            )
+            ca_mobile = ca_mobile.strip()
+            ca_name_raw = ca_name_raw.strip()
+            company_name = company_name.strip()
+            
+            if ca_mobile and company_name:
+                # Every cell arrives as its own str; interning the values that repeat across
+                # rows (a CA's name/email, statuses) keeps one copy of each in the cache
+                company_name = sys.intern(company_name)
+                company_status = sys.intern(company_status)
+                ca_email = sys.intern(ca_email)
+                
+                # CA Mobile and CA Name can have multiple entries separated by commas
+                phone_numbers = [p.strip() for p in ca_mobile.split(',')]
+                ca_names = [sys.intern(n.strip()) for n in ca_name_raw.split(',')]
+                
+                # Create individual mappings for each phone number with its corresponding CA name
+                for idx, phone in enumerate(phone_numbers):
+                    if phone:  # Skip empty strings
+                        # Get the corresponding CA name (if available)
+                        # If there are fewer names than numbers, use the last name or empty string
+                        ca_name_for_phone = ca_names[idx] if idx < len(ca_names) else (ca_names[-1] if ca_names else '')
+                        
+                        customer_details = {
+                            'company_id': company_id,
+                            'company_name': company_name,
+                            'company_status': company_status,
+                            'ca_name': ca_name_for_phone,  # Only the specific CA name for this phone
+                            'ca_email': ca_email,
+                            'ca_mobile': phone,  # Only this specific phone number
+                            'original_phone': phone
+                        }
+                        
+                        clean_number = self.normalize_phone(phone)
+                        cache[clean_number] = customer_details
+                        if len(clean_number) == 12 and clean_number.startswith('91') and not clean_number.startswith('91', 2):
+                            local_numbers[clean_number[2:]] = customer_details
+                        if len(clean_number) >= 10:
+                            # First row wins, matching the old in-order scan
+                            cache_by_last10.setdefault(clean_number[-10:], customer_details)
+                        phone_count += 1
+                        if log_rows:
+                            logger.debug(f"  📞 Cached: {phone} → {company_name} ({ca_name_for_phone})")
+        
+        # The +91 fallback is resolved here rather than per lookup: a sheet number stored as
+        # 91XXXXXXXXXX also answers for XXXXXXXXXX, unless that number is itself in the sheet
+        for number, customer_details in local_numbers.items():
+            cache.setdefault(number, customer_details)
+        
+        self.cache = cache
+        self.cache_by_last10 = cache_by_last10
+        return phone_count
+    
+    def _save_snapshot(self, values, modified_time: Optional[str]):
+        """Write the sheet values to disk so a restarted process can serve lookups immediately."""
+        try:
+            # Written aside and renamed into place, so a crash never leaves a torn snapshot
+            tmp_file = self.SNAPSHOT_FILE.with_suffix('.tmp')
+            tmp_file.unlink(missing_ok=True)  # O_CREAT only applies the mode to a new file
+            fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, 'w', encoding='utf-8') as f:
+                json.dump({'modified_time': modified_time, 'values': values}, f)
+            os.replace(tmp_file, self.SNAPSHOT_FILE)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save customer cache snapshot: {e}")
+    
+    def _load_snapshot(self):
+        """Serve the last saved sheet load until the first refresh revalidates it."""
+        try:
+            snapshot = json.loads(self.SNAPSHOT_FILE.read_text(encoding='utf-8'))
+            saved_at = datetime.utcfromtimestamp(self.SNAPSHOT_FILE.stat().st_mtime)
+            phone_count = self._build_cache(snapshot['values'])
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load customer cache snapshot: {e}")
+            return
+        
+        self.cache_loaded = True
+        self.last_modified_time = snapshot.get('modified_time')
+        self.last_cache_refresh = saved_at
+        logger.info(f"💾 Loaded {phone_count} phone number mappings from snapshot saved {saved_at.strftime('%Y-%m-%d %H:%M:%S UTC')}")
+    
+    def refresh_cache(self) -> bool:
+        """Reload the sheet now, serialized with the lazy reload in lookup_customer."""
+        with self._refresh_lock:
+            return self.load_customer_cache()
+    
+    def _refresh_in_background(self):
+        """Reload the sheet, then release the lock lookup_customer took for this refresh."""
+        try:
+            self.load_customer_cache()
+        finally:
+            self._refresh_lock.release()
+    
+    def _cache_age(self) -> timedelta:
+        """Time since the last successful sheet load (zero if never loaded)."""
+        if not self.last_cache_refresh:
+            return timedelta(0)
+        return datetime.utcnow() - self.last_cache_refresh
+    
     def lookup_customer(self, phone_number: str) -> Optional[Dict[str, str]]:
         """
         Lookup customer details by phone number with auto-refresh every 30 minutes.
@@ -157,23 +303,6 @@ class CustomerLookup:
                 logger.debug("⚠️ Google Sheets client not initialized - skipping customer lookup")
                 return None
             
-            # Check if cache needs refresh (older than 30 minutes)
-            cache_expired = False
-            if self.last_cache_refresh:
-                time_since_refresh = datetime.utcnow() - self.last_cache_refresh
-                cache_expired = time_since_refresh > self.cache_refresh_interval
-                
-                if cache_expired:
-                    minutes_old = int(time_since_refresh.total_seconds() / 60)
-                    logger.info(f"🔄 Cache is {minutes_old} minutes old - refreshing from Google Sheets...")
-            
-            # Load cache if not loaded OR if expired
-            if not self.cache_loaded or cache_expired:
-                if not self.cache_loaded:
-                    logger.info("📥 Loading customer data from Google Sheets (first time)...")
-                if not self.load_customer_cache():
-                    return None
-            
             # Clean phone number
             clean_number = self.normalize_phone(phone_number)
             
@@ -181,34 +310,49 @@ class CustomerLookup:
             if clean_number.startswith('0') and len(clean_number) > 10:
                 clean_number = clean_number[1:]
             
-            logger.info(f"🔍 Looking up customer for: {phone_number} (normalized: {clean_number})")
+            # Empty or too short to be a phone number - no probes, no miss logging, and no
+            # first-time sheet load triggered by malformed input
+            if len(clean_number) < MIN_PHONE_DIGITS:
+                logger.debug("⏭️ Skipping customer lookup for invalid number: %r", phone_number)
+                return None
+            
+            # Load cache if not loaded - the only case where a lookup waits on Sheets
+            if not self.cache_loaded:
+                # Concurrent lookups queue here instead of each loading the sheet;
+                # whoever gets the lock second finds the cache loaded and skips the load
+                with self._refresh_lock:
+                    if not self.cache_loaded:
+                        logger.info("📥 Loading customer data from Google Sheets (first time)...")
+                        if not self.load_customer_cache():
+                            return None
+            
+            logger.debug("🔍 Looking up customer for: %s (normalized: %s)", phone_number, clean_number)
             
-            # Try exact match first
-            if clean_number in self.cache:
-                customer_details = self.cache[clean_number]
+            # Exact match first - the cache also holds each 91-prefixed sheet number under its
+            # 10-digit form, so this one probe covers the +91 variant too
+            customer_details = self.cache.get(clean_number)
+            if customer_details:
                 logger.info(f"✅ Found customer (exact match) for {phone_number}: {customer_details['company_name']}")
                 return customer_details
             
-            # Try with 91 prefix (India country code)
-            if not clean_number.startswith('91') and len(clean_number) == 10:
-                clean_number_with_91 = '91' + clean_number
-                if clean_number_with_91 in self.cache:
-                    customer_details = self.cache[clean_number_with_91]
-                    logger.info(f"✅ Found customer (with +91) for {phone_number}: {customer_details['company_name']}")
-                    return customer_details
+            # Try partial match (last 10 digits) - one probe into the suffix index
+            last_10 = clean_number[-10:]
+            details = self.cache_by_last10.get(last_10)
+            if details:
+                logger.info(f"✅ Found customer (last 10 digits match) for {phone_number}: {details['company_name']}")
+                return details
             
-            # Try partial match (last 10 digits)
-            last_10 = clean_number[-10:] if len(clean_number) >= 10 else clean_number
-            for cached_number, details in self.cache.items():
-                # Match if last 10 digits are the same
-                if len(cached_number) >= 10 and cached_number[-10:] == last_10:
-                    logger.info(f"✅ Found customer (last 10 digits match) for {phone_number}: {details['company_name']}")
-                    return details
+            # Expiry is only checked on a miss (the startup refresher keeps a hot cache current);
+            # an expired cache is reloaded in the background - a reload already in flight holds
+            # the lock, so only one runs at a time
+            if self._cache_age() > self.cache_refresh_interval and self._refresh_lock.acquire(blocking=False):
+                minutes_old = int(self._cache_age().total_seconds() / 60)
+                logger.info(f"🔄 Cache is {minutes_old} minutes old - refreshing from Google Sheets in the background...")
+                threading.Thread(target=self._refresh_in_background, daemon=True).start()
             
             # No match found
             logger.warning(f"❌ No customer details found for {phone_number}")
-            logger.warning(f"   Tried: {clean_number}, 91{clean_number[-10:] if len(clean_number) >= 10 else clean_number}, last 10: {last_10}")
-            logger.warning(f"   Total cached numbers: {len(self.cache)}")
+            logger.debug("   Tried: %s, last 10: %s (cached numbers: %s)", clean_number, last_10, len(self.cache))
             return None
             
         except Exception as e: